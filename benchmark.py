@@ -0,0 +1,264 @@
+import sys, os, json, time, random, argparse, tempfile, shutil, platform, subprocess, tracemalloc
+import skc_core
+import image_store
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+OPS = ["add_product", "batch_modify_skc", "undo_batch_delete", "import_excel_data", "import_csv_data", "save_project_data",
+       "save_project_data_sqlite", "ExcelSaveThread.run", "export_csv", "refresh_table"]
+
+
+# ---------- 生成测试项目 ----------
+def parse_status_mix(text):
+    """"核价通过=70,已下架=30" -> ([状态], [权重])；空则 status_options 均匀分布"""
+    if not text:
+        return list(skc_core.status_options), [1] * len(skc_core.status_options)
+    statuses, weights = [], []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        statuses.append(name.strip())
+        weights.append(float(weight or 1))
+    return statuses, weights
+
+
+def make_database(total, per_product, statuses, weights, seed=0):
+    rnd = random.Random(seed)
+    products = max(total // per_product, 1)
+    db = {}
+    n = 0
+    for p in range(products):
+        count = per_product if p < products - 1 else total - n
+        picks = rnd.choices(statuses, weights, k=count)
+        db[f"HH{p:06d}"] = {f"SKC{n + i:09d}": s for i, s in enumerate(picks)}
+        n += count
+    return db
+
+
+def make_images(folder, db, count):
+    """给前 count 个货号生成小图片（需要 Pillow）"""
+    if not count:
+        return {}
+    try:
+        from PIL import Image
+    except ImportError:
+        print("未安装 Pillow，跳过图片", file=sys.stderr)
+        return {}
+    img_dir = os.path.join(folder, "bench_images")
+    os.makedirs(img_dir, exist_ok=True)
+    images = {}
+    for i, product in enumerate(list(db)[:count]):
+        path = os.path.join(img_dir, f"{product}.png")
+        Image.new("RGB", (400, 400), ((i * 37) % 256, (i * 91) % 256, 128)).save(path)
+        images[product] = image_store.add(folder, path)
+    return images
+
+
+def make_project(workdir, index, total, args):
+    """在 workdir 下生成 skc-data-N 结构的项目（data.json）"""
+    folder = os.path.join(workdir, f"skc-data-{index}")
+    os.makedirs(folder, exist_ok=True)
+    statuses, weights = parse_status_mix(args.status_mix)
+    db = make_database(total, args.per_product, statuses, weights, seed=index)
+    images = make_images(folder, db, args.images)
+    project = skc_core.new_project(folder, db, images)
+    skc_core.save_project(project)
+    return project
+
+
+def copy_project(project):
+    return skc_core.new_project(project["folder"], {p: dict(s) for p, s in project["database"].items()},
+                                dict(project["images"]))
+
+
+# ---------- 计时 ----------
+def measure(fn, setup, memory):
+    """返回 (秒, 峰值 MB)；memory=True 时另跑一遍 tracemalloc 统计峰值，不影响计时"""
+    state = setup()
+    start = time.perf_counter()
+    fn(state)
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        state = setup()
+        tracemalloc.start()
+        fn(state)
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def bench_ops(project, args, tmp):
+    """返回 {操作名: (setup, fn, 处理条数)}"""
+    db = project["database"]
+    all_skcs = [skc for skcs in db.values() for skc in skcs]
+    rnd = random.Random(1)
+    ops = {}
+
+    # 界面每次添加一批 SKC：逐批查重写入
+    batches = [[f"NEW{b:05d}_{i}" for i in range(10)] for b in range(args.add_batches)]
+    ops["add_product"] = (lambda: copy_project(project),
+                          lambda p: [skc_core.add_skcs(p, "HH000000", batch, skc_core.status_options[0]) for batch in batches],
+                          len(batches) * 10)
+
+    sample = rnd.sample(all_skcs, min(len(all_skcs), max(len(all_skcs) // 10, 1)))
+    ops["batch_modify_skc"] = (lambda: copy_project(project),
+                               lambda p: skc_core.modify_skcs(p, sample, skc_core.status_options[2]),
+                               len(sample))
+
+    # 误删 10% 的 SKC 后撤销：按修改记录恢复，不读取导出文件
+    def undo_setup():
+        p = copy_project(project)
+        skc_core.delete_skcs(p, sample)
+        return p
+    ops["undo_batch_delete"] = (undo_setup, lambda p: skc_core.undo_changes(p), len(sample))
+
+    excel = os.path.join(tmp, "import.xlsx")
+    if "import_excel_data" in args.ops:
+        skc_core.write_workbook(excel, db, {})
+
+    def do_import(p):
+        skc_core.merge_fragment(p, skc_core.read_workbook_fragment(excel))
+    ops["import_excel_data"] = (lambda: skc_core.new_project(os.path.join(tmp, "import-target")), do_import, len(all_skcs))
+
+    csv_file = os.path.join(tmp, "import.csv")
+    if "import_csv_data" in args.ops:
+        skc_core.write_flat(csv_file, db)
+    ops["import_csv_data"] = (lambda: skc_core.new_project(os.path.join(tmp, "import-target")),
+                              lambda p: skc_core.merge_fragment(p, skc_core.read_flat_fragment(csv_file)),
+                              len(all_skcs))
+
+    def do_save_json(p):
+        skc_core.STORAGE_BACKEND = "json"
+        skc_core.save_project(p)
+    ops["save_project_data"] = (lambda: skc_core.new_project(os.path.join(tmp, "save-json"), db, project["images"]),
+                                do_save_json, len(all_skcs))
+
+    def do_save_sqlite(p):
+        skc_core.STORAGE_BACKEND = "sqlite"
+        try:
+            skc_core.save_project(p)
+            # 之后 100 次单条修改走增量写入
+            for skc in all_skcs[:100]:
+                skc_core.modify_skcs(p, [skc], skc_core.status_options[1])
+                skc_core.save_project(p, skcs=[skc])
+        finally:
+            skc_core.STORAGE_BACKEND = "json"
+    ops["save_project_data_sqlite"] = (
+        lambda: skc_core.new_project(tempfile.mkdtemp(dir=tmp), {p: dict(s) for p, s in db.items()}, project["images"]),
+        do_save_sqlite, len(all_skcs))
+
+    ops["ExcelSaveThread.run"] = (lambda: None,
+                                  lambda _: skc_core.write_workbook(os.path.join(tmp, "export.xlsx"), db,
+                                                                    image_store.export_images(project["folder"],
+                                                                                              project["images"])),
+                                  len(all_skcs))
+    ops["export_csv"] = (lambda: None, lambda _: skc_core.write_flat(os.path.join(tmp, "export.csv"), db), len(all_skcs))
+
+    table = table_bench(project)
+    if table:
+        ops["refresh_table"] = table + (len(all_skcs),)
+    return ops
+
+
+def table_bench(project):
+    """界面表格刷新（offscreen Qt）；没有 PySide6 时返回 None"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PySide6.QtWidgets import QApplication, QTableView
+        from ui_manager import SKCTableModel
+    except ImportError:
+        print("未安装 PySide6，跳过 refresh_table", file=sys.stderr)
+        return None
+    app = QApplication.instance() or QApplication([])
+    model = SKCTableModel()
+    view = QTableView()
+    view.setModel(model)
+    view.resize(800, 600)
+    view.show()
+
+    def do_refresh(_):
+        model.set_project(project["database"], project["index"])
+        view.viewport().repaint()
+        app.processEvents()
+    return (lambda: None, do_refresh)
+
+
+# ---------- 结果 ----------
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        old = {(r["op"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\n与 {baseline_file} 对比（>1 表示变慢）:")
+    for r in results:
+        o = old.get((r["op"], r["size"]))
+        if o and o["seconds"]:
+            print(f"  {r['op']:<26}{r['size']:>9}  {r['seconds'] / o['seconds']:.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SKC 管理器性能测试：生成 1k~1M SKC 的测试项目并计时各操作")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="SKC 总数列表，默认 %(default)s")
+    parser.add_argument("--per-product", type=int, default=100, help="每个货号的 SKC 数，默认 %(default)s")
+    parser.add_argument("--status-mix", help="状态分布，如 核价通过=70,已下架=30；默认均匀")
+    parser.add_argument("--images", type=int, default=0, help="带图片的货号数")
+    parser.add_argument("--add-batches", type=int, default=100, help="add_product 测试的批次数（每批 10 个 SKC）")
+    parser.add_argument("--ops", default=",".join(OPS), help="要测的操作，默认全部")
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存（tracemalloc 会多跑一遍）")
+    parser.add_argument("--workdir", help="测试项目目录，默认临时目录（结束后删除）")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果文件，默认 %(default)s")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    args = parser.parse_args(argv)
+    args.ops = [o for o in args.ops.split(",") if o]
+    # 各操作只测本身的耗时，不包括写盘后更新跨项目索引（结果与之前的版本可比）
+    skc_core.GLOBAL_INDEX = False
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="skc-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    try:
+        for i, size in enumerate(int(s) for s in args.sizes.split(",")):
+            print(f"生成 {size} 个 SKC 的项目...")
+            project = make_project(workdir, i + 1, size, args)
+            tmp = tempfile.mkdtemp(dir=workdir)
+            ops = bench_ops(project, args, tmp)
+            for op in args.ops:
+                if op not in ops:
+                    continue
+                setup, fn, items = ops[op]
+                seconds, peak = measure(fn, setup, not args.no_memory)
+                r = {"op": op, "size": size, "items": items, "seconds": round(seconds, 6),
+                     "items_per_sec": round(items / seconds, 1) if seconds else None,
+                     "peak_mb": round(peak, 2) if peak is not None else None}
+                results.append(r)
+                mem = f"{r['peak_mb']:>9.1f} MB" if peak is not None else ""
+                print(f"  {op:<26}{size:>9}  {seconds:>9.3f}s  {r['items_per_sec'] or 0:>12.0f}/s {mem}")
+            shutil.rmtree(tmp, ignore_errors=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {k: getattr(args, k) for k in ("sizes", "per_product", "status_mix", "images", "add_batches")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os, json, time, threading
+from perf_stats import timed
+
+# 项目文件夹内的修改记录：每次修改记一条变化（只记变化的 SKC 前后的货号/状态），用于撤销/重做/恢复到某一时刻
+LOG_FILE = "changes.jsonl"
+# 最多可撤销的步数
+MAX_STEPS = 200
+# 每追加这么多条记录检查一次，丢掉超出 MAX_STEPS 的旧记录并写一个检查点（重写整个文件）
+CHECKPOINT_EVERY = 50
+
+_logs = {}
+_lock = threading.Lock()
+_last_id = 0
+
+
+def _next_id():
+    """记录编号：纳秒时间戳，同一时刻的多条记录依次加一"""
+    global _last_id
+    with _lock:
+        _last_id = max(time.time_ns(), _last_id + 1)
+        return _last_id
+
+
+def change_record(label, groups=(), images=(), count=None):
+    """一次修改的记录
+
+    groups: [(原货号, 原状态, 新货号, 新状态, [SKC...])]，同一组前后状态相同，不存在的一边为 None
+    images: [(货号, 原图片, 新图片)]
+    count: 修改后项目的 SKC 数
+    """
+    return {"op": "change", "id": _next_id(), "time": time.time(), "label": label, "count": count,
+            "groups": [[old_p, old_s, new_p, new_s, list(skcs)] for old_p, old_s, new_p, new_s, skcs in groups],
+            "images": [list(i) for i in images]}
+
+
+def skc_total(rec):
+    return sum(len(g[4]) for g in rec["groups"])
+
+
+def targets(ops, direction):
+    """把要撤销（undo，新的在前）或重做（redo，旧的在前）的几条记录合并成一次修改
+
+    返回 (目标, 预期, 图片)：目标 {SKC: (货号, 状态) 或 None}，预期为修改前应有的状态（用于检查冲突），
+    图片 {货号: 图片或 None}。同一 SKC 改过多次时，目标取最后应用的一条，预期取第一条。
+    """
+    wanted, expected, images = {}, {}, {}
+    for rec in ops:
+        for old_p, old_s, new_p, new_s, skcs in rec["groups"]:
+            old = None if old_p is None else (old_p, old_s)
+            new = None if new_p is None else (new_p, new_s)
+            before, after = (new, old) if direction == "undo" else (old, new)
+            for skc in skcs:
+                wanted[skc] = after
+                expected.setdefault(skc, before)
+        for product, old, new in rec["images"]:
+            images[product] = old if direction == "undo" else new
+    return wanted, expected, images
+
+
+class ChangeLog:
+    """项目文件夹内的修改记录（changes.jsonl，只追加）
+
+    每行一条：{"op": "change", ...}（见 change_record）、{"op": "undo"/"redo", "ids": [...]}，
+    或重写文件时的 {"op": "checkpoint", "time", "count"}（更早的记录已丢弃，不能恢复到它之前）。
+    内存中 done 为已应用的修改（旧的在前），undone 为已撤销、可以重做的修改（下一步重做的在最后）。
+    记录先进内存，由写盘线程调用 write() 追加到文件。
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, LOG_FILE)
+        self.done = []
+        self.undone = []
+        self.checkpoint = None
+        self.lines = 0
+        self.unwritten = []
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with timed("changes.load") as t, open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self.lines += 1
+                self._apply(rec)
+            t.items = len(self.done) + len(self.undone)
+
+    def _apply(self, rec):
+        op = rec.get("op")
+        if op == "change":
+            self.done.append(rec)
+            self.undone.clear()
+        elif op == "undo":
+            for rid in rec["ids"]:
+                if self.done and self.done[-1]["id"] == rid:
+                    self.undone.append(self.done.pop())
+        elif op == "redo":
+            for rid in rec["ids"]:
+                if self.undone and self.undone[-1]["id"] == rid:
+                    self.done.append(self.undone.pop())
+        elif op == "checkpoint":
+            self.checkpoint = rec
+            self.done.clear()
+            self.undone.clear()
+
+    def record(self, rec):
+        """记一条修改或撤销/重做（任意线程），文件在下一次 write() 时写入"""
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self.lock:
+            self._apply(rec)
+            self.unwritten.append(line)
+
+    def peek(self, direction, steps=1):
+        """接下来要撤销（新的在前）或重做（旧的在前）的 steps 条修改"""
+        with self.lock:
+            if direction == "undo":
+                return self.done[:-steps - 1:-1] if steps > 0 else []
+            return self.undone[:-steps - 1:-1] if steps > 0 else []
+
+    def entries(self):
+        """(已应用的修改, 可重做的修改)，都按时间从旧到新"""
+        with self.lock:
+            return list(self.done), self.undone[::-1]
+
+    def write(self):
+        """把内存中的新记录写入文件；记录过多时丢掉最旧的修改并重写（检查点）"""
+        with self.lock:
+            if not self.unwritten:
+                return
+            if len(self.done) > MAX_STEPS + CHECKPOINT_EVERY or self.lines > 2 * (MAX_STEPS + CHECKPOINT_EVERY):
+                self._rewrite()
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(self.unwritten)
+            self.lines += len(self.unwritten)
+            self.unwritten = []
+
+    def _rewrite(self):
+        """只保留最近 MAX_STEPS 条修改和可重做的修改，开头写检查点（调用方持有 lock）"""
+        with timed("changes.checkpoint") as t:
+            dropped, self.done = self.done[:-MAX_STEPS], self.done[-MAX_STEPS:]
+            if dropped:
+                self.checkpoint = {"op": "checkpoint", "time": dropped[-1]["time"], "count": dropped[-1]["count"]}
+            records = ([self.checkpoint] if self.checkpoint else []) + self.done + self.undone[::-1]
+            if self.undone:
+                records.append({"op": "undo", "ids": [rec["id"] for rec in self.undone]})
+            os.makedirs(self.folder, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self.lines = len(records)
+            self.unwritten = []
+            t.items = len(self.done) + len(self.undone)
+
+
+def get_log(folder):
+    """每个项目文件夹一个 ChangeLog，首次使用时读取"""
+    key = os.path.abspath(folder)
+    with _lock:
+        log = _logs.get(key)
+        if log is None:
+            log = ChangeLog(folder)
+            _logs[key] = log
+        return log
+
+
+def write(folder):
+    """写入项目未写盘的记录（没有用过修改记录的项目什么也不做）"""
+    with _lock:
+        log = _logs.get(os.path.abspath(folder))
+    if log is not None:
+        log.write()
+
+
+def forget(folder):
+    with _lock:
+        _logs.pop(os.path.abspath(folder), None)
@@ -0,0 +1,138 @@
+import os, json, glob, time, hashlib, zipfile, threading
+
+MANIFEST_FILE = "exports.jsonl"
+ARCHIVE_FILE = "exports_archive.zip"
+
+_histories = {}
+_lock = threading.Lock()
+
+
+def content_hash(db, imgs, fmt="xlsx"):
+    """按导出顺序计算项目内容的哈希，内容和导出格式相同则导出文件也相同"""
+    h = hashlib.sha1()
+    if fmt != "xlsx":
+        h.update(fmt.encode("ascii"))
+    for product, skcs in db.items():
+        h.update(b"\x1d" + str(product).encode("utf-8"))
+        img = imgs.get(product)
+        if img:
+            h.update(b"\x1c" + str(img).encode("utf-8"))
+        for skc, status in skcs.items():
+            h.update(f"\x1f{skc}\x1e{status}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class ExportHistory:
+    """项目文件夹内的导出记录（exports.jsonl，只追加）
+
+    每行一条记录：{"op": "add", "file", "time", "size", "skcs", "hash"} 或 {"op": "remove", "file", "archived"}。
+    内存中保存仍存在的导出文件列表，最新文件/最旧文件都是 O(1)。
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_FILE)
+        self.entries = []
+        self.lines = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            self._bootstrap()
+            return
+        live = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self.lines += 1
+                if rec.get("op") == "add":
+                    live[rec["file"]] = rec
+                else:
+                    live.pop(rec.get("file"), None)
+        self.entries = list(live.values())
+
+    def _bootstrap(self):
+        """旧项目第一次使用：按修改时间登记已有的 skc_*.xlsx/csv/tsv"""
+        files = sorted((path for ext in ("xlsx", "csv", "tsv")
+                        for path in glob.glob(os.path.join(self.folder, f"skc_*.{ext}"))), key=os.path.getmtime)
+        for path in files:
+            st = os.stat(path)
+            self.entries.append({"op": "add", "file": os.path.basename(path), "time": st.st_mtime,
+                                 "size": st.st_size, "skcs": None, "hash": None})
+        self._rewrite()
+
+    def _append(self, rec):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.lines += 1
+
+    def _rewrite(self):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in self.entries:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self.lines = len(self.entries)
+
+    def latest(self):
+        """最新一次导出的记录，没有则 None"""
+        return self.entries[-1] if self.entries else None
+
+    def latest_path(self):
+        rec = self.latest()
+        return os.path.join(self.folder, rec["file"]) if rec else None
+
+    def is_unchanged(self, digest):
+        rec = self.latest()
+        return bool(rec and rec.get("hash") == digest and os.path.exists(os.path.join(self.folder, rec["file"])))
+
+    def record(self, path, skcs, digest):
+        st = os.stat(path)
+        name = os.path.basename(path)
+        # 同一秒内重复导出会覆盖同名文件，先去掉旧记录
+        self.entries = [e for e in self.entries if e["file"] != name]
+        rec = {"op": "add", "file": name, "time": time.time(), "size": st.st_size, "skcs": skcs, "hash": digest}
+        self.entries.append(rec)
+        self._append(rec)
+        # 记录行数远多于有效文件时压缩一次
+        if self.lines > max(len(self.entries) * 2, 200):
+            self._rewrite()
+
+    def rotate(self, max_files, archive=False):
+        """保持导出文件数小于 max_files；archive=True 时旧文件压缩进 exports_archive.zip 而不是删除"""
+        while len(self.entries) >= max_files:
+            rec = self.entries.pop(0)
+            path = os.path.join(self.folder, rec["file"])
+            archived = False
+            if os.path.exists(path):
+                try:
+                    if archive:
+                        with zipfile.ZipFile(os.path.join(self.folder, ARCHIVE_FILE), "a",
+                                             compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+                            zf.write(path, rec["file"])
+                        archived = True
+                    os.remove(path)
+                except Exception:
+                    pass
+            self._append({"op": "remove", "file": rec["file"], "archived": archived})
+
+
+def get_history(folder):
+    """每个项目文件夹一个 ExportHistory，首次使用时读取"""
+    key = os.path.abspath(folder)
+    with _lock:
+        history = _histories.get(key)
+        if history is None:
+            history = ExportHistory(folder)
+            _histories[key] = history
+        return history
+
+
+def forget(folder):
+    """其他进程写过导出记录后调用，下次使用时重新读取"""
+    with _lock:
+        _histories.pop(os.path.abspath(folder), None)
@@ -0,0 +1,181 @@
+import os, sqlite3, threading
+from urllib.parse import quote
+
+# 所有项目共用的 SKC 索引，放在 skc-data-* 文件夹所在的目录
+INDEX_FILE = "skc_index.db"
+# 一次 IN (...) 查询的 SKC 数
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS skcs (
+    skc TEXT NOT NULL,
+    project TEXT NOT NULL,
+    product TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (skc, project)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS projects (
+    project TEXT PRIMARY KEY,
+    signature TEXT NOT NULL
+);
+"""
+
+# 每个线程各用自己的连接（WAL 模式下读不会被写阻塞）；同一项目的重建和增量更新串行
+_local = threading.local()
+_project_locks = {}
+_locks_lock = threading.Lock()
+
+
+def root_of(folder):
+    return os.path.dirname(os.path.abspath(folder))
+
+
+def project_key(folder):
+    """索引中的项目标识：项目文件夹名"""
+    return os.path.basename(os.path.abspath(folder))
+
+
+def connect(root):
+    path = os.path.join(os.path.abspath(root), INDEX_FILE)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def close():
+    """关闭当前线程的连接（后台线程结束前调用）"""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+
+def _project_lock(folder):
+    key = os.path.abspath(folder)
+    with _locks_lock:
+        return _project_locks.setdefault(key, threading.Lock())
+
+
+def signature(folder, data_file):
+    """与索引中记录的不同说明索引已过期
+
+    data.json 为文件的修改时间和大小；data.db 为库内的写入版本（PRAGMA user_version，每次保存加一）。
+    -wal 在最后一个连接关闭时合并进 data.db 并删除，文件的时间和大小随之变化，不能用来判断。
+    """
+    path = os.path.join(folder, data_file)
+    if not os.path.exists(path):
+        return ""
+    if data_file.endswith(".db"):
+        try:
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+            try:
+                return f"{data_file}:v{conn.execute('PRAGMA user_version').fetchone()[0]}"
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return ""
+    st = os.stat(path)
+    return f"{data_file}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def is_current(folder, data_file):
+    row = connect(root_of(folder)).execute("SELECT signature FROM projects WHERE project = ?",
+                                           (project_key(folder),)).fetchone()
+    return row is not None and row[0] == signature(folder, data_file)
+
+
+def apply(folder, data_file, rows=(), deleted=()):
+    """增量更新一个项目：rows 为新增或修改的 (SKC, 货号, 状态)，deleted 为删除的 SKC"""
+    key = project_key(folder)
+    with _project_lock(folder):
+        conn = connect(root_of(folder))
+        with conn:
+            conn.executemany("DELETE FROM skcs WHERE skc = ? AND project = ?", ((s, key) for s in deleted))
+            conn.executemany("INSERT OR REPLACE INTO skcs(skc, project, product, status) VALUES (?, ?, ?, ?)",
+                             ((s, key, p, st) for s, p, st in rows))
+            _set_signature(conn, key, folder, data_file)
+
+
+def replace(folder, data_file, database, sig=None):
+    """整体重建一个项目的索引；database 为 {货号: {SKC: 状态}} 或 SKCStore
+
+    sig 为读取数据之前取的签名（重建期间文件又有修改时，下次检查仍会发现过期）。
+    """
+    key = project_key(folder)
+    with _project_lock(folder):
+        conn = connect(root_of(folder))
+        with conn:
+            conn.execute("DELETE FROM skcs WHERE project = ?", (key,))
+            conn.executemany("INSERT OR IGNORE INTO skcs(skc, project, product, status) VALUES (?, ?, ?, ?)",
+                             ((skc, key, p, s) for p, skcs in database.items() for skc, s in skcs.items()))
+            _set_signature(conn, key, folder, data_file, sig)
+
+
+def _set_signature(conn, key, folder, data_file, sig=None):
+    conn.execute("INSERT OR REPLACE INTO projects(project, signature) VALUES (?, ?)",
+                 (key, signature(folder, data_file) if sig is None else sig))
+
+
+def forget(folder):
+    """丢弃项目的签名，下次 refresh 时重建（增量更新失败时调用）"""
+    try:
+        conn = connect(root_of(folder))
+        with conn:
+            conn.execute("DELETE FROM projects WHERE project = ?", (project_key(folder),))
+    except sqlite3.Error:
+        pass
+
+
+def refresh(folders, data_file, load, should_stop=None):
+    """索引过期或从未建立的项目用 load(folder) -> database 读取后重建；返回重建的文件夹
+
+    正常使用时每次写盘都已增量更新，只有第一次使用或在程序外修改过的项目需要重建。
+    should_stop() 在每个项目之前检查，返回 True 时停止。
+    """
+    rebuilt = []
+    for folder in folders:
+        if should_stop and should_stop():
+            return rebuilt
+        if is_current(folder, data_file):
+            continue
+        sig = signature(folder, data_file)
+        replace(folder, data_file, load(folder), sig)
+        rebuilt.append(folder)
+    # 索引里已不存在的项目文件夹
+    if folders:
+        root = root_of(folders[0])
+        conn = connect(root)
+        keys = {project_key(f) for f in folders}
+        stale = [k for (k,) in conn.execute("SELECT project FROM projects") if k not in keys
+                 and not os.path.isdir(os.path.join(root, k))]
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM skcs WHERE project = ?", ((k,) for k in stale))
+                conn.executemany("DELETE FROM projects WHERE project = ?", ((k,) for k in stale))
+    return rebuilt
+
+
+def lookup(root, skcs, exclude=None):
+    """查找 SKC 在哪些项目中：返回 {SKC: [(项目文件夹名, 货号, 状态)]}，找不到的 SKC 不在结果里
+
+    exclude 为不需要的项目文件夹（例如当前项目）。
+    """
+    conn = connect(root)
+    skip = project_key(exclude) if exclude else None
+    skcs = list(dict.fromkeys(skcs))
+    result = {}
+    for i in range(0, len(skcs), LOOKUP_CHUNK):
+        chunk = skcs[i:i + LOOKUP_CHUNK]
+        sql = ("SELECT skc, project, product, status FROM skcs WHERE skc IN (%s) ORDER BY project"
+               % ",".join("?" * len(chunk)))
+        for skc, project, product, status in conn.execute(sql, chunk):
+            if project != skip:
+                result.setdefault(skc, []).append((project, product, status))
+    return result
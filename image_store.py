@@ -0,0 +1,126 @@
+import os, shutil, hashlib
+from perf_stats import timed
+
+# 项目文件夹内的图片目录：原图按内容哈希命名，相同图片只存一份（多个货号共用）
+IMAGE_DIR = "images"
+THUMB_DIR = "thumbs"
+# 导出用缩略图的最长边（像素）；Excel 中按 100×100 显示，留一倍余量
+THUMB_SIZE = 200
+THUMB_QUALITY = 85
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_stored(ref):
+    """ref 是否为图片库中的相对路径（images/<哈希>.<扩展名>）；旧数据为原图的绝对路径"""
+    return bool(ref) and not os.path.isabs(ref) and ref.startswith(IMAGE_DIR + "/")
+
+
+def resolve(folder, ref):
+    """图片引用 -> 可打开的文件路径"""
+    if is_stored(ref):
+        return os.path.join(folder, *ref.split("/"))
+    return ref
+
+
+def add(folder, path):
+    """把图片复制进项目图片库并生成缩略图，返回保存到项目数据里的引用；内容相同的图片不重复保存"""
+    digest = file_digest(path)
+    ext = os.path.splitext(path)[1].lower() or ".img"
+    ref = f"{IMAGE_DIR}/{digest}{ext}"
+    target = resolve(folder, ref)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".part"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+    try:
+        thumbnail(folder, ref)
+    except Exception:
+        pass
+    return ref
+
+
+def thumb_path(folder, ref):
+    """缩略图路径：图片库中的图片按哈希命名；旧的绝对路径按路径和修改时间命名"""
+    if is_stored(ref):
+        key = os.path.splitext(ref.split("/")[-1])[0]
+    else:
+        st = os.stat(ref)
+        key = "ext_" + hashlib.sha1(f"{ref}\0{st.st_mtime_ns}\0{st.st_size}".encode("utf-8")).hexdigest()
+    return os.path.join(folder, IMAGE_DIR, THUMB_DIR, key + ".jpg")
+
+
+def thumbnail(folder, ref):
+    """返回 ref 的缩略图路径，不存在时生成（最长边 THUMB_SIZE 的 JPEG，透明部分填白色）"""
+    path = thumb_path(folder, ref)
+    if os.path.exists(path):
+        return path
+    from PIL import Image
+    with timed("image.thumbnail") as t:
+        with Image.open(resolve(folder, ref)) as img:
+            # JPEG 按目标尺寸缩小解码，不必解出整张原图
+            img.draft("RGB", (THUMB_SIZE, THUMB_SIZE))
+            img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".part"
+            img.save(tmp, "JPEG", quality=THUMB_QUALITY)
+            os.replace(tmp, path)
+        t.bytes = os.path.getsize(path)
+    return path
+
+
+def export_images(folder, imgs):
+    """导出用的 {货号: 缩略图路径}；缩略图生成失败时用原图，原图也不存在的货号跳过"""
+    result = {}
+    for product, ref in imgs.items():
+        if not ref:
+            continue
+        try:
+            result[product] = thumbnail(folder, ref)
+        except Exception:
+            path = resolve(folder, ref)
+            if os.path.exists(path):
+                result[product] = path
+    return result
+
+
+def legacy_refs(imgs):
+    """{货号: 图片} 中还是外部绝对路径（不在图片库里）的项"""
+    return {product: ref for product, ref in imgs.items() if ref and not is_stored(ref)}
+
+
+def adopt_external(folder, imgs, should_stop=None):
+    """把旧数据中以绝对路径引用、文件仍存在的图片收进图片库（原图移走后导出仍可用）
+
+    直接修改 imgs，返回有变化的货号列表；should_stop() 返回 True 时停止（已收进的保留）。
+    """
+    changed = []
+    added = {}
+    for product, ref in list(imgs.items()):
+        if should_stop and should_stop():
+            break
+        if not ref or is_stored(ref) or not os.path.isfile(ref):
+            continue
+        try:
+            if ref not in added:
+                added[ref] = add(folder, ref)
+            imgs[product] = added[ref]
+            changed.append(product)
+        except Exception:
+            pass
+    return changed
@@ -1,142 +1,699 @@
-import sys, os, json, glob, shutil, time, subprocess
+import sys, os, json, glob, shutil, time, subprocess, queue, threading, multiprocessing
+from itertools import islice
 from PySide6.QtWidgets import (
-    QApplication, QMessageBox, QInputDialog, QFileDialog, QProgressDialog, QTableWidgetItem
+    QApplication, QMessageBox, QInputDialog, QFileDialog, QProgressDialog, QTreeWidgetItem
 )
-from PySide6.QtCore import Qt, QThread, Signal
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image as XLImage
-from ui_manager import SKCUI, status_options
+from PySide6.QtCore import Qt, QThread, QObject, QTimer, Signal
+from ui_manager import SKCUI, SKCLookupDialog, ChangeHistoryDialog, BatchEditDialog, status_options
+import sqlite_store
+import export_history
+import skc_core
+import skc_diff
+import global_index
+import change_log
+import image_store
+import perf_stats
+from skc_core import new_project
+from perf_stats import timed
 
-MAX_FILES = 100
+# 延迟导出：最后一次修改后静默多久再导出 Excel
+EXPORT_DEBOUNCE_MS = 3000
+# 项目清单：启动时只读它，不解析各项目数据
+MANIFEST_FILE = "projects.json"
+# 非当前项目闲置多久后从内存释放
+PROJECT_EVICT_SECONDS = 600
+# 导出全部项目时的进程数，None 为 CPU 核数
+EXPORT_ALL_WORKERS = None
+# 一次导入多个文件时的进程数，None 为 CPU 核数
+IMPORT_WORKERS = None
+# 批量修改预览中每组最多列出的 SKC 数（数量照常统计）
+PREVIEW_ROWS = 1000
+# 保存合并窗口：修改后等这么久再取快照写盘，期间的连续修改合并成一次写入
+SAVE_COALESCE_MS = 300
 projects = {}            
 current_project = None
+# 界面运行时的后台保存调度（SaveScheduler），为 None 时直接在当前线程保存
+project_saver = None
+# 界面运行时把旧项目的外部图片收进图片库的后台任务（ImageAdopter），为 None 时不处理
+image_adopter = None
+# 上一次写入/读到的 projects.json 内容（项目名、文件夹、SKC 数），没有变化时不重写
+_manifest_written = None
+_manifest_lock = threading.Lock()
 
 class ExcelSaveThread(QThread):
     progress = Signal(int)
     finished = Signal(str)
     error = Signal(str)
+    canceled = Signal()
+    unchanged = Signal(str)
 
     def __init__(self, project_name):
         super().__init__()
         self.project_name = project_name
+        # 在 GUI 线程拷贝一份快照，导出期间的修改不会影响本次导出
+        project = ensure_project_loaded(project_name)
+        self.folder = project["folder"]
+        self.database = project["database"].copy()
+        self.images = dict(project["images"])
 
     def run(self):
         try:
-            project = projects[self.project_name]
-            folder = project["folder"]
-            db = project["database"]
-            imgs = project["images"]
+            with timed("export.total", sum(len(skcs) for skcs in self.database.values())) as t:
+                result, filename = skc_core.export_project(self.folder, self.database, self.images,
+                                                           self.progress.emit, self.isInterruptionRequested)
+                if result == "saved":
+                    t.bytes = os.path.getsize(filename)
+            if result == "canceled":
+                self.canceled.emit()
+            elif result == "unchanged":
+                self.unchanged.emit(filename)
+            else:
+                self.finished.emit(filename)
+        except Exception as e:
+            self.error.emit(str(e))
 
-            if not os.path.exists(folder):
-                os.makedirs(folder, exist_ok=True)
 
-            files = sorted(glob.glob(os.path.join(folder, "skc_*.xlsx")), key=os.path.getmtime)
-            while len(files) >= MAX_FILES:
-                try:
-                    os.remove(files[0])
-                except:
-                    pass
-                files.pop(0)
-
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(folder, f"skc_{timestamp}.xlsx")
-
-            wb = Workbook()
-            ws = wb.active
-            col = 1
-            total = max(len(db), 1)
-            for i, (product, skcs) in enumerate(db.items(), 1):
-                
-                try:
-                    ws.merge_cells(start_row=1, start_column=col, end_row=1, end_column=col+1)
-                    ws.cell(row=1, column=col, value=product)
-                except Exception:
-                    ws.cell(row=1, column=col, value=product)
-
-               
-                if product in imgs and imgs[product]:
-                    try:
-                        img = XLImage(imgs[product])
-                        img.width = 100
-                        img.height = 100
-                        ws.add_image(img, f"{get_column_letter(col)}2")
-                        ws.row_dimensions[2].height = 80
-                        ws.column_dimensions[get_column_letter(col)].width = 15
-                    except Exception:
-                        pass
-
-                ws.cell(row=3, column=col, value="SKC")
-                ws.cell(row=3, column=col+1, value="状态")
-                r_index = 4
-                for skc, status in skcs.items():
-                    ws.cell(row=r_index, column=col, value=skc)
-                    ws.cell(row=r_index, column=col+1, value=status)
-                    r_index += 1
-                col += 2
-
-                
-                percent = int(i / total * 100)
-                self.progress.emit(percent)
-
-            wb.save(filename)
-            self.finished.emit(filename)
+class ExcelImportThread(QThread):
+    """后台流式读取 Excel 或 CSV/TSV，结果为 {货号: {SKC: 状态}}，由 GUI 线程一次性合并"""
+    progress = Signal(int)
+    finished = Signal(str, object)
+    error = Signal(str)
+    canceled = Signal()
+
+    def __init__(self, project_name, file_path):
+        super().__init__()
+        self.project_name = project_name
+        self.file_path = file_path
+
+    def run(self):
+        try:
+            fragment = skc_core.read_fragment(self.file_path, self.progress.emit, self.isInterruptionRequested)
         except Exception as e:
             self.error.emit(str(e))
+            return
+        if fragment is None:
+            self.canceled.emit()
+        else:
+            self.finished.emit(self.project_name, fragment)
+
+
+class MultiFileImportThread(QThread):
+    """用进程池并行读取多个 Excel/CSV 文件；结果按文件顺序交给 GUI 线程合并
+
+    finished 的结果为 [(文件, fragment, 错误信息)]，读取失败的 fragment 为 None。
+    """
+    progress = Signal(int)
+    finished = Signal(str, object)
+    canceled = Signal()
+
+    def __init__(self, project_name, paths):
+        super().__init__()
+        self.project_name = project_name
+        self.paths = list(paths)
+
+    def run(self):
+        # 进度按文件大小加权
+        sizes = {path: max(os.path.getsize(path), 1) if os.path.exists(path) else 1 for path in self.paths}
+        total = sum(sizes.values())
+        results = skc_core.run_in_pool(
+            skc_core.import_worker, {path: (path,) for path in self.paths},
+            lambda percents: self.progress.emit(min(sum(percents[p] * sizes[p] for p in percents) // total, 99)),
+            self.isInterruptionRequested, IMPORT_WORKERS)
+        if self.isInterruptionRequested():
+            self.canceled.emit()
+        else:
+            self.finished.emit(self.project_name, [(path, *results[path]) for path in self.paths])
+
+
+class BatchParseThread(QThread):
+    """后台把粘贴的文本或文件拆成 [(SKC, 状态或 None)]，由 GUI 线程对照项目数据预览"""
+    finished = Signal(object)
+    error = Signal(str)
+
+    def __init__(self, statuses, text=None, path=None):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.text = text
+        self.path = path
+
+    def run(self):
+        try:
+            with timed("batch.parse") as t:
+                if self.path:
+                    entries = skc_core.read_batch_file(self.path, self.statuses)
+                else:
+                    entries = skc_core.parse_batch_text(self.text, self.statuses)
+                t.items = len(entries)
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        if not self.isInterruptionRequested():
+            self.finished.emit(entries)
+
+
+class DiffThread(QThread):
+    """后台读取旧数据（data.json、快照或导出文件）与当前数据对比，有变化时写出对比表"""
+    finished = Signal(object, str)
+    error = Signal(str)
+
+    def __init__(self, project_name, old_path):
+        super().__init__()
+        project = ensure_project_loaded(project_name)
+        self.folder = project["folder"]
+        self.database = project["database"].copy()
+        self.old_path = old_path
+
+    def run(self):
+        try:
+            old = skc_diff.load_snapshot(self.old_path)
+            if self.isInterruptionRequested():
+                return
+            result = skc_diff.diff(old, skc_diff.snapshot_of(self.database))
+            filename = ""
+            if any(result.values()) and not self.isInterruptionRequested():
+                filename = skc_diff.diff_file_name(self.folder)
+                skc_diff.write_diff(filename, result, os.path.basename(self.old_path), "当前数据")
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        self.finished.emit(result, filename)
+
+
+class GlobalIndexThread(QThread):
+    """后台重建过期的跨项目 SKC 索引（第一次使用或在程序外修改过的项目）"""
+    finished = Signal(object)
+    error = Signal(str)
+
+    def __init__(self, folders):
+        super().__init__()
+        self.folders = list(folders)
+
+    def run(self):
+        try:
+            rebuilt = skc_core.refresh_global_index(self.folders, self.isInterruptionRequested)
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        finally:
+            global_index.close()
+        self.finished.emit(rebuilt)
+
+
+class ExportAllThread(QThread):
+    """用进程池并行导出多个项目；本线程只负责收集进度和结果"""
+    progress = Signal(int)
+    project_done = Signal(str, str, str)
+    finished = Signal(object)
+
+    def __init__(self, project_names):
+        super().__init__()
+        self.names = list(project_names)
+        # 已加载的项目在 GUI 线程拷贝快照；未加载的由子进程自己读取，不占用界面进程内存
+        self.jobs = []
+        for name in self.names:
+            project = projects[name]
+            snapshot = None
+            if project.get("loaded"):
+                snapshot = (project["database"].copy(), dict(project["images"]))
+            self.jobs.append((name, project["folder"], snapshot))
+
+    def run(self):
+        results = []
+
+        def on_done(name, result, error):
+            if result is None:
+                results.append((name, "error", error))
+            else:
+                results.append((name, result[0], result[1] or ""))
+            self.project_done.emit(*results[-1])
 
+        settings = skc_core.export_settings()
+        skc_core.run_in_pool(
+            skc_core.export_worker, {name: (name, folder, snapshot, settings) for name, folder, snapshot in self.jobs},
+            lambda percents: self.progress.emit(sum(percents.values()) // max(len(percents), 1)),
+            self.isInterruptionRequested, EXPORT_ALL_WORKERS, on_done)
+        self.finished.emit(results)
 
-def save_project_data(project_name):
+
+def merge_fragment(project_name, fragment):
+    """把导入结果合并进项目，已存在的 SKC 跳过；返回 (新增的 SKC, 新增的货号)"""
+    return skc_core.merge_fragment(ensure_project_loaded(project_name), fragment)
+
+
+class ExportScheduler(QObject):
+    """Excel 导出调度：合并连续修改，同一项目同时只跑一个导出
+
+    mode: "immediate" 每次修改立即导出；"debounced" 静默 EXPORT_DEBOUNCE_MS 后导出一次；
+    "manual" 只在手动保存时导出
+    """
+    started = Signal(str, object)
+    finished = Signal(str, str)
+    error = Signal(str, str)
+    canceled = Signal(str)
+    unchanged = Signal(str, str)
+    batch_started = Signal(object)
+    batch_finished = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.mode = "debounced"
+        self.timers = {}
+        self.running = {}
+        self.pending = set()
+        self.batch = None
+
+    def request(self, project_name):
+        """数据有修改时调用"""
+        if self.mode == "manual":
+            return
+        if self.mode == "immediate":
+            self.export_now(project_name)
+            return
+        timer = self.timers.get(project_name)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda name=project_name: self.export_now(name))
+            self.timers[project_name] = timer
+        timer.start(EXPORT_DEBOUNCE_MS)
+
+    def export_now(self, project_name):
+        timer = self.timers.get(project_name)
+        if timer is not None:
+            timer.stop()
+        if project_name not in projects:
+            return
+        if project_name in self.running or (self.batch is not None and project_name in self.batch.names):
+            # 正在导出：结束后再导出一次最新数据
+            self.pending.add(project_name)
+            return
+        thread = ExcelSaveThread(project_name)
+        thread.finished.connect(lambda filename, name=project_name: self._on_done(name, self.finished, filename))
+        thread.error.connect(lambda msg, name=project_name: self._on_done(name, self.error, msg))
+        thread.canceled.connect(lambda name=project_name: self._on_done(name, self.canceled))
+        thread.unchanged.connect(lambda filename, name=project_name: self._on_done(name, self.unchanged, filename))
+        self.running[project_name] = thread
+        self.started.emit(project_name, thread)
+        thread.start()
+
+    def export_all(self, project_names):
+        """进程池并行导出多个项目；正在单独导出的项目跳过。返回 False 表示已有批量导出在进行"""
+        if self.batch is not None:
+            return False
+        names = [n for n in project_names if n in projects and n not in self.running]
+        for name in names:
+            timer = self.timers.get(name)
+            if timer is not None:
+                timer.stop()
+            self.pending.discard(name)
+        self.batch = ExportAllThread(names)
+        self.batch.finished.connect(self._on_batch_done)
+        self.batch_started.emit(self.batch)
+        self.batch.start()
+        return True
+
+    def cancel_all(self):
+        if self.batch is not None:
+            self.batch.requestInterruption()
+
+    def _end_batch(self):
+        batch, self.batch = self.batch, None
+        batch.wait()
+        batch.deleteLater()
+        # 导出记录由子进程写入，丢弃本进程的缓存
+        for name in batch.names:
+            export_history.forget(projects[name]["folder"])
+        return batch
+
+    def _export_pending(self, names):
+        for name in names:
+            if name in self.pending:
+                self.pending.discard(name)
+                self.export_now(name)
+
+    def _on_batch_done(self, results):
+        batch = self._end_batch()
+        self.batch_finished.emit(results)
+        self._export_pending(batch.names)
+
+    def cancel(self, project_name):
+        timer = self.timers.get(project_name)
+        if timer is not None:
+            timer.stop()
+        self.pending.discard(project_name)
+        thread = self.running.get(project_name)
+        if thread is not None:
+            thread.requestInterruption()
+
+    def flush(self):
+        """退出前：立即导出所有等待中的项目并等待完成"""
+        if self.batch is not None:
+            self.batch.finished.disconnect()
+            self._export_pending(self._end_batch().names)
+        for name, timer in self.timers.items():
+            if timer.isActive():
+                self.export_now(name)
+        for thread in list(self.running.values()):
+            thread.wait()
+
+    def _on_done(self, project_name, signal, *args):
+        thread = self.running.pop(project_name, None)
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        signal.emit(project_name, *args)
+        if project_name in self.pending:
+            self.pending.discard(project_name)
+            self.export_now(project_name)
+
+
+class ProjectWriterThread(QThread):
+    """后台写盘线程：按顺序执行 skc_core.prepare_save 准备好的写入任务，写完后更新项目清单"""
+    saved = Signal(str)
+    error = Signal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.jobs = queue.Queue()
+        # 写入失败的项目名；SaveScheduler 取出后安排整体重写（不经过信号，退出时的 flush 也能看到）
+        self.failed = queue.Queue()
+
+    def run(self):
+        while True:
+            item = self.jobs.get()
+            try:
+                if item is None:
+                    return
+                name, job, manifest = item
+                try:
+                    skc_core.write_prepared(job)
+                    write_manifest(manifest)
+                    self.saved.emit(name)
+                except Exception as e:
+                    self.failed.put(name)
+                    self.error.emit(name, str(e))
+            finally:
+                self.jobs.task_done()
+
+
+class SaveScheduler(QObject):
+    """项目保存调度：修改先记下来，SAVE_COALESCE_MS 后在 GUI 线程取快照，交给后台线程写盘
+
+    同一项目同时只有一个写入任务，写入期间的修改合并到下一次写入；界面线程不做磁盘 I/O。
+    """
+    error = Signal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 项目名 -> 待保存的变化（full 为整体重写）
+        self.pending = {}
+        self.writing = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.dispatch)
+        self.writer = ProjectWriterThread()
+        self.writer.saved.connect(self._on_saved)
+        self.writer.error.connect(self._on_error)
+        self.writer.start()
+
+    def request(self, project_name, skcs=None, deleted=None, products=None, image_products=None):
+        change = self.pending.setdefault(project_name, {"full": False, "skcs": [], "deleted": [],
+                                                        "products": [], "image_products": []})
+        if skcs is None and deleted is None and products is None and image_products is None:
+            change["full"] = True
+        else:
+            change["skcs"].extend(skcs or ())
+            change["deleted"].extend(deleted or ())
+            change["products"].extend(products or ())
+            change["image_products"].extend(image_products or ())
+        if not self.timer.isActive():
+            self.timer.start(SAVE_COALESCE_MS)
+
+    def _requeue_failed(self):
+        """写入失败的项目标记为整体重写（失败的增量行已经取出，只能按内存中的数据重写）；返回这些项目名"""
+        failed = set()
+        while True:
+            try:
+                name = self.writer.failed.get_nowait()
+            except queue.Empty:
+                return failed
+            self.pending.setdefault(name, {"full": True, "skcs": [], "deleted": [],
+                                           "products": [], "image_products": []})["full"] = True
+            failed.add(name)
+
+    def dispatch(self):
+        self._requeue_failed()
+        for name in list(self.pending):
+            if name in self.writing:
+                continue
+            change = self.pending.pop(name)
+            project = projects.get(name)
+            if project is None or not project.get("loaded"):
+                continue
+            if change["full"]:
+                job = skc_core.prepare_save(project)
+            else:
+                job = skc_core.prepare_save(project, change["skcs"], change["deleted"],
+                                            change["products"], change["image_products"])
+            self.writing.add(name)
+            # 清单内容在 GUI 线程取出，由写盘线程写入（没有变化时跳过）
+            self.writer.jobs.put((name, job, manifest_entries()))
+
+    def busy(self, project_name):
+        return project_name in self.pending or project_name in self.writing
+
+    def flush(self):
+        """立即写入所有待保存的修改并等待写完（退出、导出项目文件夹前）"""
+        self.timer.stop()
+        retried = set()
+        while True:
+            self.writer.jobs.join()
+            self.writing.clear()
+            # 失败的项目这里重试一次；再失败就留在 pending，等下一次保存
+            failed = self._requeue_failed()
+            if not set(self.pending) - (failed & retried):
+                break
+            retried |= failed
+            self.dispatch()
+
+    def stop(self):
+        self.flush()
+        self.writer.jobs.put(None)
+        self.writer.wait()
+        save_manifest()
+
+    def _on_saved(self, project_name):
+        self.writing.discard(project_name)
+        if project_name in self.pending and not self.timer.isActive():
+            self.timer.start(0)
+
+    def _on_error(self, project_name, msg):
+        """失败的项目已标记为整体重写，下一次保存（或退出前）时执行，不自动重试以免磁盘满时反复写"""
+        self.writing.discard(project_name)
+        self._requeue_failed()
+        self.error.emit(project_name, msg)
+
+
+class ImageAdoptThread(QThread):
+    """后台把旧数据中以绝对路径引用的图片复制进图片库并生成缩略图（计算哈希、复制文件都不在界面线程）
+
+    finished 的结果为 {货号: (原引用, 图片库中的引用)}。
+    """
+    finished = Signal(str, object)
+
+    def __init__(self, project_name, folder, images):
+        super().__init__()
+        self.project_name = project_name
+        self.folder = folder
+        self.images = images
+
+    def run(self):
+        imgs = dict(self.images)
+        with timed("image.adopt") as t:
+            changed = image_store.adopt_external(self.folder, imgs, self.isInterruptionRequested)
+            t.items = len(changed)
+        self.finished.emit(self.project_name, {p: (self.images[p], imgs[p]) for p in changed})
+
+
+class ImageAdopter(QObject):
+    """项目加载后在后台收进外部图片；完成后在 GUI 线程更新引用并保存（期间改过的货号不覆盖）"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.threads = {}
+
+    def request(self, project_name):
+        project = projects[project_name]
+        legacy = image_store.legacy_refs(project["images"])
+        if not legacy or project_name in self.threads:
+            return
+        thread = ImageAdoptThread(project_name, project["folder"], legacy)
+        thread.finished.connect(self._on_done)
+        self.threads[project_name] = thread
+        thread.start()
+
+    def _on_done(self, project_name, adopted):
+        thread = self.threads.pop(project_name, None)
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        project = projects.get(project_name)
+        if project is None or not project.get("loaded"):
+            return
+        changed = []
+        for product, (old, new) in adopted.items():
+            if project["images"].get(product) == old:
+                project["images"][product] = new
+                changed.append(product)
+        if changed:
+            save_project_data(project_name, image_products=changed)
+
+    def stop(self):
+        for thread in self.threads.values():
+            thread.requestInterruption()
+        for thread in list(self.threads.values()):
+            thread.wait()
+        self.threads.clear()
+
+
+def save_project_data(project_name, skcs=None, deleted=None, products=None, image_products=None):
+    """保存项目；sqlite 模式下传入变化的 SKC/货号/图片时只写这些行，否则整体重写
+
+    界面运行时交给 project_saver 在后台合并写盘，否则直接写入。
+    """
     project = projects[project_name]
-    folder = project["folder"]
-    if not os.path.exists(folder):
-        os.makedirs(folder, exist_ok=True)
-    data_file = os.path.join(folder, "data.json")
+    if not project.get("loaded"):
+        return
+    if project_saver is not None:
+        project_saver.request(project_name, skcs, deleted, products, image_products)
+        return
     try:
-        with open(data_file, "w", encoding="utf-8") as f:
-            json.dump({"database": project["database"], "images": project["images"]}, f, ensure_ascii=False, indent=2)
+        skc_core.save_project(project, skcs, deleted, products, image_products)
     except Exception as e:
-        QMessageBox.warning(None, "保存失败", f"保存 data.json 失败: {e}")
+        QMessageBox.warning(None, "保存失败", f"保存 {skc_core.data_file_name()} 失败: {e}")
+        return
+    save_manifest()
 
 def load_project_data(project_name):
+    project = skc_core.read_project_data(projects[project_name])
+    if image_adopter is not None:
+        image_adopter.request(project_name)
+    recovered = project.pop("recovered_from", None)
+    error = project.pop("load_error", None)
+    if recovered:
+        QMessageBox.warning(None, "数据已恢复",
+                            f"项目 {project_name} 的数据文件损坏或缺失，已从快照恢复：\n{recovered}")
+    elif error:
+        QMessageBox.warning(None, "读取失败",
+                            f"项目 {project_name} 的数据无法读取，没有可用快照，已按空项目打开\n{error}\n"
+                            f"损坏的 data.json 已另存为 data.json.corrupt")
+
+def ensure_project_loaded(project_name):
+    """首次使用时才加载项目数据"""
     project = projects[project_name]
-    data_file = os.path.join(project["folder"], "data.json")
-    if os.path.exists(data_file):
+    project["last_used"] = time.time()
+    if not project.get("loaded"):
+        load_project_data(project_name)
+    return project
+
+def evict_idle_projects():
+    """释放长时间未使用的非当前项目（数据每次修改都已保存，释放后可随时重新加载）"""
+    now = time.time()
+    for name, project in projects.items():
+        if name == current_project or not project.get("loaded"):
+            continue
+        if now - project.get("last_used", 0) < PROJECT_EVICT_SECONDS:
+            continue
+        if project_saver is not None and project_saver.busy(name):
+            continue
+        for key in ("database", "images", "index", "search"):
+            project.pop(key, None)
+        project["loaded"] = False
+        if skc_core.STORAGE_BACKEND == "sqlite":
+            sqlite_store.close(project["folder"])
+
+def load_manifest():
+    global _manifest_written
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("projects", [])
+        _manifest_written = manifest_key(entries)
+        return {e["folder"]: e for e in entries}
+    except Exception:
+        return {}
+
+def manifest_entries():
+    return [{"name": name, "folder": p["folder"], "skc_count": p.get("skc_count", 0), "mtime": p.get("mtime", 0)}
+            for name, p in projects.items()]
+
+def manifest_key(entries):
+    """决定是否需要重写清单的字段；mtime 每次保存都变，只随其他字段的变化一起写入"""
+    return [(e.get("name"), e.get("folder"), e.get("skc_count", 0)) for e in entries]
+
+def write_manifest(entries):
+    """写 projects.json；与上次写入的内容相同时跳过（写盘线程和 GUI 线程都会调用）"""
+    global _manifest_written
+    key = manifest_key(entries)
+    with _manifest_lock:
+        if key == _manifest_written:
+            return
+        tmp_file = MANIFEST_FILE + ".tmp"
         try:
-            with open(data_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            project["database"] = data.get("database", {})
-            project["images"] = data.get("images", {})
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"projects": entries}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, MANIFEST_FILE)
+            _manifest_written = key
         except Exception:
             pass
 
+def save_manifest():
+    write_manifest(manifest_entries())
+
 def load_all_projects():
+    """按清单登记所有项目，只加载第一个项目的数据，其余在切换时加载"""
     global projects, current_project
     folders = sorted([d for d in os.listdir() if os.path.isdir(d) and d.startswith("skc-data-")])
+    manifest = load_manifest()
     projects.clear()
     for i, folder in enumerate(folders, 1):
-        name = f"项目{i}"
-        projects[name] = {"database": {}, "images": {}, "folder": folder}
-        load_project_data(name)
+        entry = manifest.get(folder, {})
+        name = entry.get("name") or f"项目{i}"
+        if name in projects:
+            name = folder
+        mtime = entry.get("mtime")
+        if not mtime:
+            data_file = os.path.join(folder, skc_core.data_file_name())
+            mtime = os.path.getmtime(data_file) if os.path.exists(data_file) else 0
+        projects[name] = {"folder": folder, "loaded": False,
+                          "skc_count": entry.get("skc_count", 0), "mtime": mtime}
     if not projects:
         name = "项目1"
         folder = "skc-data-1"
         os.makedirs(folder, exist_ok=True)
-        projects[name] = {"database": {}, "images": {}, "folder": folder}
+        projects[name] = new_project(folder)
         save_project_data(name)
     current_project = list(projects.keys())[0]
+    ensure_project_loaded(current_project)
+    save_manifest()
 
 def get_current_database():
     if current_project and current_project in projects:
-        return projects[current_project]["database"], projects[current_project]["images"]
+        project = ensure_project_loaded(current_project)
+        return project["database"], project["images"]
     return None, None
 
+def get_current_index():
+    if current_project and current_project in projects:
+        return ensure_project_loaded(current_project)["index"]
+    return None
+
 def open_latest_file(project_name):
     folder = projects[project_name]["folder"]
-    files = sorted(glob.glob(os.path.join(folder, "skc_*.xlsx")), key=os.path.getmtime)
-    if not files:
+    latest_file = export_history.get_history(folder).latest_path()
+    if not latest_file or not os.path.exists(latest_file):
         QMessageBox.information(None, "提示", "当前没有生成的 Excel 文件")
         return
-    latest_file = files[-1]
     try:
         if sys.platform.startswith("win"):
             os.startfile(latest_file)
@@ -150,9 +707,29 @@ def open_latest_file(project_name):
 
 class SKCManagerLogic:
     def __init__(self, ui: SKCUI):
+        global project_saver, image_adopter
         self.ui = ui
-        self.thread = None
-        self.progress_dialog = None
+        self.saver = SaveScheduler(ui)
+        project_saver = self.saver
+        self.adopter = ImageAdopter(ui)
+        image_adopter = self.adopter
+        self.exporter = ExportScheduler(ui)
+        self.progress_dialogs = {}
+        self.export_all_dialog = None
+        self.import_thread = None
+        self.import_dialog = None
+        self.diff_thread = None
+        self.diff_dialog = None
+        self.index_thread = None
+        self.lookup_dialog = None
+        self.history_dialog = None
+        self.batch_dialog = None
+        self.batch_thread = None
+        self.batch_entries = None
+        self.batch_source = ""
+        # 当前预览对应的项目；应用时与当前项目不同则拒绝（对话框不是模态的，期间可以切换项目）
+        self.batch_project = None
+        self.perf_timer = None
         self.setup()
 
     def setup(self):
@@ -160,67 +737,209 @@ class SKCManagerLogic:
         self.ui.btn_add.clicked.connect(self.add_product)
         self.ui.btn_batch_modify.clicked.connect(self.batch_modify_skc)
         self.ui.btn_batch_delete.clicked.connect(self.batch_delete_skc)
-        self.ui.btn_auto_sort.clicked.connect(self.auto_sort_by_status)
+        self.ui.btn_export_now.clicked.connect(self.export_now)
         self.ui.btn_add_image.clicked.connect(self.confirm_add_image)
         self.ui.btn_import_excel.clicked.connect(self.import_excel_data)
+        self.ui.btn_import_folder.clicked.connect(self.import_folder_data)
         self.ui.btn_open_latest.clicked.connect(self.open_latest_excel)
+        self.ui.btn_diff.clicked.connect(self.compare_with_file)
+        self.ui.btn_lookup.clicked.connect(self.show_lookup_dialog)
+        self.ui.btn_undo.clicked.connect(self.undo_change)
+        self.ui.btn_redo.clicked.connect(self.redo_change)
+        self.ui.btn_history.clicked.connect(self.show_history_dialog)
+        self.ui.undo_shortcut.activated.connect(self.undo_change)
+        self.ui.redo_shortcut.activated.connect(self.redo_change)
+        self.ui.btn_export_all.clicked.connect(self.export_all_projects)
         self.ui.btn_clear_skc.clicked.connect(lambda: self.ui.entry_skc.clear())
         self.ui.project_combo.currentTextChanged.connect(self.on_project_changed)
         self.ui.btn_new_project.clicked.connect(self.create_project_ui)
         self.ui.btn_switch_project.clicked.connect(self.switch_project_ui)
         self.ui.btn_import_project.clicked.connect(self.import_project_ui)
         self.ui.btn_export_project.clicked.connect(self.export_project_ui)
+        self.ui.export_mode_combo.currentIndexChanged.connect(self.on_export_mode_changed)
+        if skc_core.EXPORT_FORMAT in skc_core.EXPORT_FORMATS:
+            self.ui.export_format_combo.setCurrentIndex(skc_core.EXPORT_FORMATS.index(skc_core.EXPORT_FORMAT))
+        self.ui.export_format_combo.currentIndexChanged.connect(self.on_export_format_changed)
+        self.ui.filter_skc.textChanged.connect(self.refresh_filter)
+        self.ui.filter_product.textChanged.connect(self.refresh_filter)
+        for action in self.ui.status_filter_actions:
+            action.toggled.connect(self.refresh_filter)
+        self.ui.btn_clear_filter.clicked.connect(self.clear_filter)
+        self.exporter.started.connect(self.on_save_started)
+        self.exporter.finished.connect(self.on_save_finished)
+        self.exporter.error.connect(self.on_save_error)
+        self.exporter.canceled.connect(self.close_progress_dialog)
+        self.exporter.unchanged.connect(self.on_save_unchanged)
+        self.exporter.batch_started.connect(self.on_export_all_started)
+        self.exporter.batch_finished.connect(self.on_export_all_finished)
+        self.saver.error.connect(self.on_persist_error)
+        QApplication.instance().aboutToQuit.connect(self.stop_workers)
+        QApplication.instance().aboutToQuit.connect(self.adopter.stop)
+        QApplication.instance().aboutToQuit.connect(self.saver.stop)
+        QApplication.instance().aboutToQuit.connect(self.exporter.flush)
+        self.on_export_mode_changed(self.ui.export_mode_combo.currentIndex())
+
+        self.evict_timer = QTimer(self.ui)
+        self.evict_timer.timeout.connect(evict_idle_projects)
+        self.evict_timer.start(60 * 1000)
+
+        self.ui.perf_shortcut.activated.connect(self.toggle_perf_panel)
+        self.ui.perf_enabled.setChecked(perf_stats.ENABLED)
+        self.ui.perf_enabled.toggled.connect(perf_stats.set_enabled)
+        self.ui.btn_perf_clear.clicked.connect(self.clear_perf_stats)
+        self.ui.btn_perf_log.clicked.connect(self.choose_perf_log)
+        self.perf_timer = QTimer(self.ui)
+        self.perf_timer.timeout.connect(self.refresh_perf_panel)
 
         load_all_projects()
+        self.ui.project_combo.blockSignals(True)
         self.ui.project_combo.clear()
-        for p in projects.keys():
-            self.ui.project_combo.addItem(p)
+        for i, (name, project) in enumerate(projects.items()):
+            self.ui.project_combo.addItem(name)
+            self.ui.project_combo.setItemData(i, f"{project.get('skc_count', 0)} 个 SKC", Qt.ToolTipRole)
+        self.ui.project_combo.blockSignals(False)
         if current_project:
             self.ui.project_combo.setCurrentText(current_project)
         self.refresh_table()
+        self.refresh_global_index()
 
     
-    def save_database_async(self):
+    def save_database_async(self, force=False):
+        """数据修改后调用，按导出模式安排 Excel 导出；force=True 时立即导出"""
         if not current_project:
             QMessageBox.warning(self.ui, "提示", "请先选择项目")
             return
-        self.progress_dialog = QProgressDialog("正在保存 Excel...", "取消", 0, 100, self.ui)
-        self.progress_dialog.setWindowTitle("保存中")
-        self.progress_dialog.setWindowModality(Qt.WindowModal)
-        self.progress_dialog.show()
-
-        self.thread = ExcelSaveThread(current_project)
-        self.thread.progress.connect(self.progress_dialog.setValue)
-        self.thread.finished.connect(self.on_save_finished)
-        self.thread.error.connect(self.on_save_error)
-        self.progress_dialog.canceled.connect(self.thread.terminate)
-        self.thread.start()
-
-    def on_save_finished(self, filename):
-        if self.progress_dialog:
-            self.progress_dialog.close()
+        if force:
+            self.exporter.export_now(current_project)
+        else:
+            self.exporter.request(current_project)
+
+    def on_export_mode_changed(self, idx):
+        self.exporter.mode = ("debounced", "immediate", "manual")[max(idx, 0)]
+
+    def on_export_format_changed(self, idx):
+        skc_core.EXPORT_FORMAT = skc_core.EXPORT_FORMATS[max(idx, 0)]
+
+    def on_save_started(self, project_name, thread):
+        dialog = QProgressDialog(f"正在保存 {project_name} Excel...", "取消", 0, 100, self.ui)
+        dialog.setWindowTitle("保存中")
+        dialog.setWindowModality(Qt.WindowModal)
+        thread.progress.connect(dialog.setValue)
+        dialog.canceled.connect(lambda name=project_name: self.exporter.cancel(name))
+        dialog.show()
+        self.progress_dialogs[project_name] = dialog
+
+    def close_progress_dialog(self, project_name):
+        dialog = self.progress_dialogs.pop(project_name, None)
+        if dialog:
+            dialog.canceled.disconnect()
+            dialog.close()
+
+    def on_save_finished(self, project_name, filename):
+        self.close_progress_dialog(project_name)
         QMessageBox.information(self.ui, "完成", f"已保存: {filename}")
 
-    def on_save_error(self, msg):
-        if self.progress_dialog:
-            self.progress_dialog.close()
+    def on_save_unchanged(self, project_name, filename):
+        self.close_progress_dialog(project_name)
+        QMessageBox.information(self.ui, "完成", f"内容与上次导出相同，未生成新文件: {filename}")
+
+    def on_save_error(self, project_name, msg):
+        self.close_progress_dialog(project_name)
         QMessageBox.warning(self.ui, "保存失败", f"保存失败: {msg}")
 
+    def on_persist_error(self, project_name, msg):
+        QMessageBox.warning(self.ui, "保存失败",
+                            f"项目 {project_name} 保存 {skc_core.data_file_name()} 失败: {msg}\n"
+                            "磁盘上仍是上一次保存的数据，下次保存或退出时会按当前数据整体重写")
+
     
     def refresh_table(self):
+        """整体刷新（切换项目、整理、导入后）"""
+        db, _ = get_current_database()
+        with timed("table.refresh") as t:
+            self.ui.table_model.set_project(db, get_current_index())
+            t.items = self.ui.table_model.rowCount()
+        self.refresh_product_combo()
+        self.refresh_filter()
+
+    def refresh_filter(self):
+        """按筛选栏条件过滤表格，并更新各状态数量"""
+        if not current_project or current_project not in projects:
+            self.ui.status_count_label.setText("")
+            return
+        project = projects[current_project]
+        search = project["search"]
+        with timed("table.filter") as t:
+            allowed = search.query(project["database"], project["index"],
+                                   self.ui.filter_skc.text().strip(),
+                                   self.ui.filter_product.text().strip(),
+                                   self.ui.selected_statuses())
+            if allowed is not None or self.ui.table_model.allowed is not None:
+                self.ui.table_model.set_filter(allowed)
+            t.items = self.ui.table_model.rowCount()
+        counts = search.counts()
+        text = "  ".join(f"{s} {n}" for s, n in counts.items())
+        text += f"  |  共 {len(project['index'])}"
+        if allowed is not None:
+            text += f"，筛选出 {self.ui.table_model.rowCount()}"
+        self.ui.status_count_label.setText(text)
+
+    def clear_filter(self):
+        for w in [self.ui.filter_skc, self.ui.filter_product]:
+            w.blockSignals(True)
+            w.clear()
+            w.blockSignals(False)
+        for action in self.ui.status_filter_actions:
+            action.setChecked(False)
+        self.refresh_filter()
+
+    def toggle_perf_panel(self):
+        visible = self.ui.perf_panel.isHidden()
+        self.ui.perf_panel.setVisible(visible)
+        if visible:
+            self.refresh_perf_panel()
+            self.perf_timer.start(1000)
+        else:
+            self.perf_timer.stop()
+
+    def clear_perf_stats(self):
+        perf_stats.clear()
+        self.refresh_perf_panel()
+
+    def choose_perf_log(self):
+        path, _ = QFileDialog.getSaveFileName(self.ui, "性能日志文件（JSON lines，取消则不写）", "perf_log.jsonl",
+                                              "JSON Lines (*.jsonl)")
+        perf_stats.set_log_file(path)
+        self.ui.btn_perf_log.setToolTip(path)
+
+    def refresh_perf_panel(self):
+        """按操作汇总耗时，并列出最近几次记录"""
+        lines = [f"{'操作':<20}{'次数':>4}{'平均ms':>10}{'最大ms':>10}{'总ms':>11}{'条数':>10}{'字节':>12}"]
+        for name, s in sorted(perf_stats.summary().items()):
+            lines.append(f"{name:<22}{s['count']:>6}{s['avg_ms']:>12.1f}{s['max_ms']:>12.1f}"
+                         f"{s['total_ms']:>12.1f}{s['items']:>12}{s['bytes']:>14}")
+        counters = perf_stats.counters()
+        if counters:
+            lines.append("计数: " + "  ".join(f"{k}={v}" for k, v in sorted(counters.items())))
+        lines.append("最近:")
+        for rec in reversed(perf_stats.recent(10)):
+            lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(rec['ts']))}  {rec['name']:<20}"
+                         f"{rec['ms']:>10.1f} ms  {rec['items']} 条  {rec['bytes']} 字节")
+        if not perf_stats.ENABLED:
+            lines.insert(0, "计时未开启（勾选“开启计时”或启动前设置环境变量 SKC_PERF=1）")
+        self.ui.perf_text.setPlainText("\n".join(lines))
+
+    def refresh_product_combo(self):
         db, _ = get_current_database()
-        if not db:
-            self.ui.table.setRowCount(0)
-            self.ui.image_product_combo.clear()
-            return
-        self.ui.image_product_combo.clear()
-        self.ui.image_product_combo.addItems(list(db.keys()))
-        items = [(p, skc, s) for p, skcs in db.items() for skc, s in skcs.items()]
-        self.ui.table.setRowCount(len(items))
-        for r, (product, skc, status) in enumerate(items):
-            self.ui.table.setItem(r, 0, QTableWidgetItem(str(product)))
-            self.ui.table.setItem(r, 1, QTableWidgetItem(str(skc)))
-            self.ui.table.setItem(r, 2, QTableWidgetItem(str(status)))
+        products = list(db.keys()) if db else []
+        combo = self.ui.image_product_combo
+        if combo.count() == len(products) and all(combo.itemText(i) == p for i, p in enumerate(products)):
+            return
+        current = combo.currentText()
+        combo.clear()
+        combo.addItems(products)
+        if current in products:
+            combo.setCurrentText(current)
 
     
     def add_product(self):
@@ -237,94 +956,333 @@ class SKCManagerLogic:
             QMessageBox.warning(self.ui, "提示", "请输入 SKC")
             return
         status = self.ui.status_combo.currentText()
-        if product not in db:
-            db[product] = {}
-        added = 0
-        for skc in skc_text.split():
-            s = str(skc).strip()
-            if any(s in skcs for p, skcs in db.items()):
-                continue
-            db[product][s] = status
-            added += 1
-        save_project_data(current_project)
+        if self.ui.cross_project_check.isChecked() and not self.confirm_cross_project(skc_text.split()):
+            return
+        added, new_products = skc_core.add_skcs(projects[current_project], product, skc_text.split(), status)
+        save_project_data(current_project, skcs=added, products=new_products)
         self.save_database_async()
-        QMessageBox.information(self.ui, "完成", f"新增 {added} 个 SKC（重复自动跳过）")
+        QMessageBox.information(self.ui, "完成", f"新增 {len(added)} 个 SKC（重复自动跳过）")
         self.ui.entry_product.clear()
         self.ui.entry_skc.clear()
-        self.refresh_table()
+        self.ui.table_model.skcs_added(product, added)
+        if new_products:
+            self.refresh_product_combo()
+        self.refresh_filter()
+
+    def confirm_cross_project(self, skcs):
+        """要添加的 SKC 已在其他项目中时提示；返回是否继续添加"""
+        try:
+            found = skc_core.lookup_skcs(projects[current_project]["folder"], skcs, exclude_self=True)
+        except Exception:
+            return True
+        if not found:
+            return True
+        names = {os.path.basename(os.path.abspath(p["folder"])): name for name, p in projects.items()}
+        lines = [f"{skc}: " + "；".join(f"{names.get(f, f)} {product} {status}" for f, product, status in hits)
+                 for skc, hits in islice(found.items(), 20)]
+        if len(found) > 20:
+            lines.append(f"…… 共 {len(found)} 个")
+        answer = QMessageBox.question(self.ui, "其他项目中已有这些 SKC",
+                                      "\n".join(lines) + "\n\n仍然添加到当前项目？")
+        return answer == QMessageBox.Yes
+
+    def refresh_global_index(self):
+        """启动时在后台检查跨项目索引，只重建过期的项目"""
+        if self.index_thread is not None or not projects:
+            return
+        thread = GlobalIndexThread(p["folder"] for p in projects.values())
+        thread.finished.connect(self._end_index_refresh)
+        thread.error.connect(self._end_index_refresh)
+        self.index_thread = thread
+        thread.start()
+
+    def stop_workers(self):
+        """退出时：中断导入（含进程池）、对比、批量读取和跨项目索引线程并等待结束（索引未完成的下次启动继续）"""
+        threads = [t for t in (self.import_thread, self.diff_thread, self.batch_thread, self.index_thread)
+                   if t is not None]
+        for thread in threads:
+            thread.requestInterruption()
+        for thread in threads:
+            thread.wait()
+
+    def _end_index_refresh(self, *args):
+        thread, self.index_thread = self.index_thread, None
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+
+    def show_lookup_dialog(self):
+        if not projects:
+            QMessageBox.warning(self.ui, "提示", "没有项目")
+            return
+        if self.lookup_dialog is None:
+            self.lookup_dialog = SKCLookupDialog(self.ui)
+            self.lookup_dialog.btn_find.clicked.connect(self.run_lookup)
+            self.lookup_dialog.btn_copy.clicked.connect(
+                lambda: QApplication.clipboard().setText(self.lookup_dialog.result.toPlainText()))
+        self.lookup_dialog.show()
+        self.lookup_dialog.raise_()
+
+    def run_lookup(self):
+        dialog = self.lookup_dialog
+        skcs = skc_core.parse_skc_text(dialog.input.toPlainText())
+        if not skcs:
+            return
+        folder = next(iter(projects.values()))["folder"]
+        with timed("index.lookup", len(skcs)):
+            found = skc_core.lookup_skcs(folder, skcs)
+        names = {os.path.basename(os.path.abspath(p["folder"])): name for name, p in projects.items()}
+        lines, missing = [], []
+        for skc in dict.fromkeys(skcs):
+            hits = found.get(skc)
+            if not hits:
+                missing.append(skc)
+                continue
+            for f, product, status in hits:
+                lines.append(f"{skc}\t{names.get(f, f)}\t{product}\t{status}")
+        dups = sum(1 for hits in found.values() if len(hits) > 1)
+        text = f"找到 {len(found)} 个，未找到 {len(missing)} 个"
+        if dups:
+            text += f"，{dups} 个在多个项目中"
+        if self.index_thread is not None:
+            text += "（索引正在更新，结果可能不完整）"
+        dialog.summary.setText(text)
+        dialog.result.setPlainText("\n".join(lines + [f"{skc}\t未找到" for skc in missing]))
 
     def batch_modify_skc(self):
+        self.show_batch_dialog(delete=False)
+
+    def batch_delete_skc(self):
+        self.show_batch_dialog(delete=True)
+
+    def show_batch_dialog(self, delete):
         db, _ = get_current_database()
         if db is None:
             QMessageBox.warning(self.ui, "提示", "请先选择项目")
             return
-        text, ok = QInputDialog.getText(self.ui, "批量修改 SKC", "请输入 SKC（空格隔开）:")
-        if not ok or not text:
-            return
-        skc_list = text.strip().split()
-        status, ok2 = QInputDialog.getItem(self.ui, "选择状态", "状态:", status_options, 0, False)
-        if not ok2:
-            return
-        modified = 0
-        not_found = []
-        for skc in skc_list:
-            s = str(skc).strip()
-            found = False
-            for product, skcs in db.items():
-                if s in skcs:
-                    skcs[s] = status
-                    modified += 1
-                    found = True
-            if not found:
-                not_found.append(s)
-        save_project_data(current_project)
-        self.save_database_async()
-        msg = f"已修改 {modified} 个 SKC 为「{status}」"
-        if not_found:
-            msg += "\n未找到 SKC: " + " ".join(not_found)
+        if self.batch_dialog is None:
+            dialog = self.batch_dialog = BatchEditDialog(self.ui)
+            dialog.btn_file.clicked.connect(self.choose_batch_file)
+            dialog.btn_preview.clicked.connect(lambda: self.start_batch_parse(text=dialog.input.toPlainText()))
+            dialog.btn_apply.clicked.connect(self.apply_batch_changes)
+            dialog.input.textChanged.connect(self.clear_batch_preview)
+            dialog.mode_combo.currentIndexChanged.connect(lambda i: dialog.status_combo.setEnabled(i == 0))
+            dialog.mode_combo.currentIndexChanged.connect(self.refresh_batch_preview)
+            dialog.status_combo.currentIndexChanged.connect(self.refresh_batch_preview)
+        self.batch_dialog.mode_combo.setCurrentIndex(1 if delete else 0)
+        self.batch_dialog.show()
+        self.batch_dialog.raise_()
+
+    def choose_batch_file(self):
+        path, _ = QFileDialog.getOpenFileName(self.batch_dialog, "选择 SKC 列表文件", "",
+                                              "文本文件 (*.txt *.csv *.tsv);;所有文件 (*)")
+        if path:
+            self.start_batch_parse(path=path)
+
+    def start_batch_parse(self, text=None, path=None):
+        """在后台拆分文本/文件，完成后预览"""
+        if self.batch_thread is not None or not (text and text.strip() or path):
+            return
+        statuses = status_options
+        if current_project in projects and projects[current_project].get("loaded"):
+            statuses = projects[current_project]["database"].statuses
+        self.clear_batch_preview()
+        self.batch_source = os.path.basename(path) if path else ""
+        self.batch_dialog.summary.setText("正在读取……")
+        for btn in [self.batch_dialog.btn_file, self.batch_dialog.btn_preview]:
+            btn.setEnabled(False)
+        thread = BatchParseThread(statuses, text, path)
+        thread.finished.connect(self.on_batch_parsed)
+        thread.error.connect(self.on_batch_parse_error)
+        self.batch_thread = thread
+        thread.start()
+
+    def _end_batch_parse(self):
+        thread, self.batch_thread = self.batch_thread, None
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        for btn in [self.batch_dialog.btn_file, self.batch_dialog.btn_preview]:
+            btn.setEnabled(True)
+
+    def on_batch_parsed(self, entries):
+        self._end_batch_parse()
+        self.batch_entries = entries
+        self.refresh_batch_preview()
+
+    def on_batch_parse_error(self, msg):
+        self._end_batch_parse()
+        self.batch_dialog.summary.setText("")
+        QMessageBox.warning(self.batch_dialog, "读取失败", f"无法读取: {msg}")
+
+    def clear_batch_preview(self):
+        self.batch_entries = None
+        self.batch_project = None
+        if self.batch_dialog is not None:
+            self.batch_dialog.preview.clear()
+            self.batch_dialog.summary.setText("")
+            self.batch_dialog.btn_apply.setEnabled(False)
+
+    def plan_batch(self):
+        dialog = self.batch_dialog
+        return skc_core.plan_batch(ensure_project_loaded(current_project), self.batch_entries,
+                                   dialog.status_combo.currentText(), dialog.mode_combo.currentIndex() == 1)
+
+    def refresh_batch_preview(self):
+        """按当前项目的数据分组预览：状态变化（或将删除）、状态不变、未找到"""
+        dialog = self.batch_dialog
+        if self.batch_entries is None or not current_project:
+            return
+        plan = self.plan_batch()
+        self.batch_project = current_project
+        dialog.preview.clear()
+        change_label = "将删除" if plan["delete"] else "状态变化"
+        groups = [(change_label, plan["change"])]
+        if not plan["delete"]:
+            groups.append(("状态不变", plan["same"]))
+        groups.append(("未找到", [(skc,) for skc in plan["not_found"]]))
+        with timed("batch.preview", sum(len(rows) for _, rows in groups)):
+            for label, rows in groups:
+                top = QTreeWidgetItem([f"{label}（{len(rows)}）"])
+                top.addChildren([QTreeWidgetItem([v or "" for v in row]) for row in islice(rows, PREVIEW_ROWS)])
+                if len(rows) > PREVIEW_ROWS:
+                    top.addChild(QTreeWidgetItem([f"…… 另有 {len(rows) - PREVIEW_ROWS} 个"]))
+                dialog.preview.addTopLevelItem(top)
+                top.setExpanded(bool(rows))
+        text = f"项目 {current_project}：{len(plan['change']) + len(plan['same']) + len(plan['not_found'])} 个 SKC"
+        if self.batch_source:
+            text = f"{self.batch_source} → " + text
+        if plan["duplicates"]:
+            text += f"（重复 {plan['duplicates']} 行，以最后一行为准）"
+        text += f"，{change_label} {len(plan['change'])}，未找到 {len(plan['not_found'])}"
+        dialog.summary.setText(text)
+        dialog.btn_apply.setEnabled(bool(plan["change"]))
+
+    def apply_batch_changes(self):
+        """按当前数据重新核对后一次应用：一次保存、一次导出、一步撤销"""
+        if self.batch_entries is None or not current_project:
+            return
+        if self.batch_project != current_project:
+            self.clear_batch_preview()
+            QMessageBox.warning(self.batch_dialog, "提示", "预览之后切换了项目，请重新预览")
+            return
+        plan = self.plan_batch()
+        project = projects[current_project]
+        changed = skc_core.apply_batch(project, plan)
+        if plan["delete"]:
+            save_project_data(current_project, deleted=changed)
+            self.ui.table_model.skcs_removed(changed)
+            msg = f"已删除 {len(changed)} 个 SKC"
+        else:
+            save_project_data(current_project, skcs=changed)
+            self.ui.table_model.skcs_changed(changed)
+            msg = f"已修改 {len(changed)} 个 SKC 的状态"
+            if plan["same"]:
+                msg += f"，{len(plan['same'])} 个状态未变"
+        if changed:
+            self.save_database_async()
+        if plan["not_found"]:
+            msg += f"\n未找到 {len(plan['not_found'])} 个 SKC: " + " ".join(plan["not_found"][:50])
+            if len(plan["not_found"]) > 50:
+                msg += " ……"
+        self.refresh_filter()
+        self.batch_dialog.input.clear()
+        self.clear_batch_preview()
+        self.batch_dialog.hide()
         QMessageBox.information(self.ui, "完成", msg)
-        self.refresh_table()
 
-    def batch_delete_skc(self):
+    def export_now(self):
+        """数据始终按状态整理好、每次修改都已保存，这里只需手动导出一次"""
         db, _ = get_current_database()
         if db is None:
+            return
+        self.save_database_async(force=True)
+
+    def undo_change(self):
+        self.replay_changes(lambda project, force: skc_core.undo_changes(project, 1, force),
+                            "撤销", "没有可以撤销的修改")
+
+    def redo_change(self):
+        self.replay_changes(lambda project, force: skc_core.redo_changes(project, 1, force),
+                            "重做", "没有可以重做的修改")
+
+    def replay_changes(self, action, verb, empty_msg):
+        """按修改记录撤销/重做/恢复：action(project, force) 为 skc_core 的 undo/redo/restore"""
+        if not current_project:
             QMessageBox.warning(self.ui, "提示", "请先选择项目")
             return
-        text, ok = QInputDialog.getText(self.ui, "批量删除 SKC", "请输入 SKC（空格隔开）:")
-        if not ok or not text:
-            return
-        skc_list = text.strip().split()
-        deleted = 0
-        not_found = []
-        for skc in skc_list:
-            s = str(skc).strip()
-            found = False
-            for product, skcs in list(db.items()):
-                if s in skcs:
-                    del skcs[s]
-                    deleted += 1
-                    found = True
-            if not found:
-                not_found.append(s)
-        save_project_data(current_project)
+        name = current_project
+        project = ensure_project_loaded(name)
+        result = action(project, False)
+        if result is None:
+            QMessageBox.information(self.ui, "提示", empty_msg)
+            return
+        if result["conflicts"]:
+            conflicts = result["conflicts"]
+            sample = " ".join(conflicts[:10]) + (" ……" if len(conflicts) > 10 else "")
+            answer = QMessageBox.question(self.ui, "数据在记录之后被修改过",
+                                          f"{len(conflicts)} 个 SKC 在这之后被其他方式修改过：\n{sample}\n\n"
+                                          f"仍然{verb}？这些 SKC 会改成记录中的状态")
+            if answer != QMessageBox.Yes:
+                return
+            result = action(project, True)
+        save_project_data(name, skcs=result["skcs"], deleted=result["deleted"], products=result["products"],
+                          image_products=result["image_products"])
         self.save_database_async()
-        msg = f"已删除 {deleted} 个 SKC"
-        if not_found:
-            msg += "\n未找到 SKC: " + " ".join(not_found)
-        QMessageBox.information(self.ui, "完成", msg)
         self.refresh_table()
+        if self.history_dialog is not None and self.history_dialog.isVisible():
+            self.refresh_history_dialog()
+        labels = [rec["label"] for rec in result["ops"]]
+        msg = f"已{verb} {len(labels)} 步修改：\n" + "\n".join(labels[:10])
+        if len(labels) > 10:
+            msg += f"\n…… 共 {len(labels)} 步"
+        QMessageBox.information(self.ui, "完成", msg)
 
-    def auto_sort_by_status(self):
-        db, _ = get_current_database()
-        if db is None:
+    def show_history_dialog(self):
+        if not current_project:
+            QMessageBox.warning(self.ui, "提示", "请先选择项目")
             return
-        for product, skcs in list(db.items()):
-            sorted_items = sorted(skcs.items(), key=lambda kv: status_options.index(kv[1]) if kv[1] in status_options else len(status_options))
-            db[product] = dict(sorted_items)
-        save_project_data(current_project)
-        self.save_database_async()
-        QMessageBox.information(self.ui, "完成", "已按状态顺序整理 SKC")
-        self.refresh_table()
+        if self.history_dialog is None:
+            self.history_dialog = ChangeHistoryDialog(self.ui)
+            self.history_dialog.btn_restore.clicked.connect(self.restore_selected_change)
+        self.refresh_history_dialog()
+        self.history_dialog.show()
+        self.history_dialog.raise_()
+
+    def refresh_history_dialog(self):
+        """列出当前项目的修改记录，最早的在上；第 i 行为应用了前 i 步修改之后的状态"""
+        dialog = self.history_dialog
+        if not current_project or current_project not in projects:
+            return
+        log = change_log.get_log(projects[current_project]["folder"])
+        done, redo = log.entries()
+        dialog.list.clear()
+        if log.checkpoint:
+            start = time.strftime("%m-%d %H:%M:%S", time.localtime(log.checkpoint["time"]))
+            dialog.list.addItem(f"{start}  更早的记录已清理（{log.checkpoint['count']} 个 SKC）")
+        else:
+            dialog.list.addItem("记录开始")
+        for i, rec in enumerate(done + redo):
+            text = f"{time.strftime('%m-%d %H:%M:%S', time.localtime(rec['time']))}  {rec['label']}"
+            if i >= len(done):
+                dialog.list.addItem("[已撤销] " + text)
+                dialog.list.item(i + 1).setForeground(Qt.gray)
+            else:
+                dialog.list.addItem(text + ("  ← 当前" if i == len(done) - 1 else ""))
+        dialog.list.setCurrentRow(len(done))
+        dialog.summary.setText(f"项目 {current_project}：可撤销 {len(done)} 步，可重做 {len(redo)} 步")
+
+    def restore_selected_change(self):
+        """选中第 row 行：撤销它之后的修改，或重做到它为止"""
+        row = self.history_dialog.list.currentRow()
+        if row < 0:
+            return
+        done, _ = change_log.get_log(ensure_project_loaded(current_project)["folder"]).entries()
+        if row < len(done):
+            action = lambda project, force: skc_core.undo_changes(project, len(done) - row, force)
+        else:
+            action = lambda project, force: skc_core.redo_changes(project, row - len(done), force)
+        self.replay_changes(action, "恢复", "已经是这一步之后的数据")
 
     def confirm_add_image(self):
         db, imgs = get_current_database()
@@ -345,11 +1303,14 @@ class SKCManagerLogic:
         if not img_path:
             QMessageBox.warning(self.ui, "提示", "请拖入或粘贴图片")
             return
-        imgs[product] = img_path
-        save_project_data(current_project)
+        try:
+            skc_core.set_image(projects[current_project], product, img_path)
+        except Exception as e:
+            QMessageBox.warning(self.ui, "失败", f"无法保存图片: {e}")
+            return
+        save_project_data(current_project, image_products=[product])
         self.save_database_async()
         QMessageBox.information(self.ui, "完成", f"已为货号 {product} 添加图片")
-        self.refresh_table()
         self.ui.image_drop_label.clear()
 
     def import_excel_data(self):
@@ -357,39 +1318,205 @@ class SKCManagerLogic:
         if db is None:
             QMessageBox.warning(self.ui, "提示", "请先选择项目")
             return
-        file_path, _ = QFileDialog.getOpenFileName(self.ui, "选择 Excel 文件", "", "Excel (*.xlsx *.xlsm)")
-        if not file_path:
+        if self.import_thread is not None:
+            QMessageBox.warning(self.ui, "提示", "正在导入，请稍候")
+            return
+        file_paths, _ = QFileDialog.getOpenFileNames(self.ui, "选择 Excel / CSV 文件（可多选）", "",
+                                                     "Excel / CSV (*.xlsx *.xlsm *.csv *.tsv *.txt);;"
+                                                     "Excel (*.xlsx *.xlsm);;CSV / TSV (*.csv *.tsv *.txt)")
+        if not file_paths:
+            return
+        if len(file_paths) > 1:
+            self.start_multi_import(file_paths)
+            return
+        file_path = file_paths[0]
+        dialog = QProgressDialog(f"正在导入 {os.path.basename(file_path)}...", "取消", 0, 100, self.ui)
+        dialog.setWindowTitle("导入中")
+        dialog.setWindowModality(Qt.WindowModal)
+        thread = ExcelImportThread(current_project, file_path)
+        thread.progress.connect(dialog.setValue)
+        thread.finished.connect(self.on_import_finished)
+        thread.error.connect(self.on_import_error)
+        thread.canceled.connect(self.on_import_canceled)
+        dialog.canceled.connect(thread.requestInterruption)
+        self.import_thread = thread
+        self.import_dialog = dialog
+        dialog.show()
+        thread.start()
+
+    def import_folder_data(self):
+        db, _ = get_current_database()
+        if db is None:
+            QMessageBox.warning(self.ui, "提示", "请先选择项目")
+            return
+        if self.import_thread is not None:
+            QMessageBox.warning(self.ui, "提示", "正在导入，请稍候")
+            return
+        folder = QFileDialog.getExistingDirectory(self.ui, "选择包含 Excel / CSV 文件的文件夹")
+        if not folder:
+            return
+        paths = skc_core.expand_import_paths([folder])
+        if not paths:
+            QMessageBox.warning(self.ui, "提示", "文件夹中没有 Excel / CSV 文件")
+            return
+        self.start_multi_import(paths)
+
+    def start_multi_import(self, paths):
+        """多个文件在子进程中并行读取，全部读完后按文件顺序合并"""
+        dialog = QProgressDialog(f"正在导入 {len(paths)} 个文件...", "取消", 0, 100, self.ui)
+        dialog.setWindowTitle("导入中")
+        dialog.setWindowModality(Qt.WindowModal)
+        thread = MultiFileImportThread(current_project, paths)
+        thread.progress.connect(dialog.setValue)
+        thread.finished.connect(self.on_multi_import_finished)
+        thread.canceled.connect(self.on_import_canceled)
+        dialog.canceled.connect(thread.requestInterruption)
+        self.import_thread = thread
+        self.import_dialog = dialog
+        dialog.show()
+        thread.start()
+
+    def _end_import(self):
+        thread, self.import_thread = self.import_thread, None
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        if self.import_dialog:
+            self.import_dialog.canceled.disconnect()
+            self.import_dialog.close()
+            self.import_dialog = None
+
+    def on_import_finished(self, project_name, fragment):
+        self._end_import()
+        if project_name not in projects:
             return
         try:
-            wb = load_workbook(file_path, data_only=True)
-        except Exception as e:
-            QMessageBox.warning(self.ui, "导入失败", f"无法打开文件: {e}")
-            return
-        imported = 0
-        for ws in wb.worksheets:
-            max_col = ws.max_column
-            for col in range(1, max_col+1, 2):
-                product = ws.cell(row=1, column=col).value
-                if not product:
-                    continue
-                product = str(product)
-                if product not in db:
-                    db[product] = {}
-                max_row = ws.max_row
-                for row in range(4, max_row+1):
-                    skc = ws.cell(row=row, column=col).value
-                    status = ws.cell(row=row, column=col+1).value
-                    if skc and status:
-                        s_skc = str(skc).strip()
-                        if any(s_skc in skcs for p, skcs in db.items()):
-                            continue
-                        db[product][s_skc] = str(status)
-                        imported += 1
-        save_project_data(current_project)
-        self.save_database_async()
-        QMessageBox.information(self.ui, "完成", f"成功导入 {imported} 条记录")
+            imported, new_products = merge_fragment(project_name, fragment)
+        except ValueError as e:
+            QMessageBox.warning(self.ui, "导入失败", str(e))
+            return
+        save_project_data(project_name, skcs=imported, products=new_products)
+        self.exporter.request(project_name)
+        QMessageBox.information(self.ui, "完成", f"成功导入 {len(imported)} 条记录")
         self.refresh_table()
 
+    def on_multi_import_finished(self, project_name, results):
+        self._end_import()
+        if project_name not in projects:
+            return
+        project = ensure_project_loaded(project_name)
+        imported, new_products, report = skc_core.merge_fragments(project, results)
+        if imported or new_products:
+            save_project_data(project_name, skcs=imported, products=new_products)
+            self.exporter.request(project_name)
+        failed = sum(1 for r in report if r[3])
+        read = sum(r[1] for r in report)
+        lines = []
+        for path, count, added, error in report:
+            if error:
+                lines.append(f"{os.path.basename(path)}: 失败 {error}")
+            else:
+                lines.append(f"{os.path.basename(path)}: 读取 {count} 条，导入 {added} 条，跳过重复 {count - added} 条")
+        summary = f"{len(report)} 个文件，成功导入 {len(imported)} 条记录，跳过重复 {read - len(imported)} 条"
+        if failed:
+            summary += f"，{failed} 个文件读取失败"
+        QMessageBox.information(self.ui, "导入完成", summary + "\n\n" + "\n".join(lines))
+        self.refresh_table()
+
+    def on_import_error(self, msg):
+        self._end_import()
+        QMessageBox.warning(self.ui, "导入失败", f"无法打开文件: {msg}")
+
+    def on_import_canceled(self):
+        self._end_import()
+        QMessageBox.information(self.ui, "提示", "已取消导入，项目未修改")
+
+    def export_all_projects(self):
+        if not projects:
+            QMessageBox.warning(self.ui, "提示", "没有项目")
+            return
+        if not self.exporter.export_all(list(projects)):
+            QMessageBox.information(self.ui, "提示", "正在导出全部项目，请等待完成")
+
+    def on_export_all_started(self, thread):
+        total = len(thread.names)
+        dialog = QProgressDialog(f"正在导出 {total} 个项目（{os.cpu_count()} 核并行）...", "取消", 0, 100, self.ui)
+        dialog.setWindowTitle("导出全部项目")
+        dialog.setWindowModality(Qt.WindowModal)
+        thread.progress.connect(dialog.setValue)
+        done = []
+
+        def on_project_done(name, result, detail):
+            done.append(name)
+            dialog.setLabelText(f"已完成 {len(done)}/{total}：{name}")
+        thread.project_done.connect(on_project_done)
+        dialog.canceled.connect(self.exporter.cancel_all)
+        dialog.show()
+        self.export_all_dialog = dialog
+
+    def on_export_all_finished(self, results):
+        if self.export_all_dialog:
+            self.export_all_dialog.canceled.disconnect()
+            self.export_all_dialog.close()
+            self.export_all_dialog = None
+        labels = {"saved": "已保存", "unchanged": "未变化", "canceled": "已取消", "error": "失败"}
+        lines = [f"{name}: {labels.get(result, result)} {os.path.basename(detail) if result != 'error' else detail}"
+                 for name, result, detail in results]
+        summary = "  ".join(f"{labels[r]} {n}" for r, n in
+                            ((r, sum(1 for x in results if x[1] == r)) for r in labels) if n)
+        QMessageBox.information(self.ui, "导出全部项目", (summary + "\n\n" + "\n".join(lines)).strip())
+
+    def compare_with_file(self):
+        """选择旧的 data.json / 快照 / 导出文件，与当前数据对比"""
+        if not current_project:
+            QMessageBox.warning(self.ui, "提示", "请先选择项目")
+            return
+        if self.diff_thread is not None:
+            QMessageBox.warning(self.ui, "提示", "正在对比，请稍候")
+            return
+        folder = projects[current_project]["folder"]
+        start = skc_diff.latest_export(folder) or folder
+        old_path, _ = QFileDialog.getOpenFileName(
+            self.ui, "选择要对比的旧数据（data.json、.snapshots 中的快照或导出文件）", start,
+            "数据 / 导出文件 (*.json *.xlsx *.xlsm *.csv *.tsv *.txt *.db)")
+        if not old_path:
+            return
+        dialog = QProgressDialog(f"正在对比 {os.path.basename(old_path)}...", None, 0, 0, self.ui)
+        dialog.setWindowTitle("对比中")
+        dialog.setWindowModality(Qt.WindowModal)
+        thread = DiffThread(current_project, old_path)
+        thread.finished.connect(lambda result, filename, path=old_path: self.on_diff_finished(path, result, filename))
+        thread.error.connect(self.on_diff_error)
+        self.diff_thread = thread
+        self.diff_dialog = dialog
+        dialog.show()
+        thread.start()
+
+    def _end_diff(self):
+        thread, self.diff_thread = self.diff_thread, None
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        if self.diff_dialog:
+            self.diff_dialog.close()
+            self.diff_dialog = None
+
+    def on_diff_finished(self, old_path, result, filename):
+        self._end_diff()
+        head = f"原: {os.path.basename(old_path)}\n新: 当前数据\n\n"
+        if not filename:
+            QMessageBox.information(self.ui, "对比结果", head + "没有变化")
+            return
+        lines = []
+        for label, skc, old_product, new_product, old_status, new_status in islice(skc_diff.iter_rows(result), 20):
+            lines.append(f"{label} {skc}: {old_product or ''} {old_status or ''} → {new_product or ''} {new_status or ''}")
+        QMessageBox.information(self.ui, "对比结果", head + skc_diff.summary(result) + "\n\n" + "\n".join(lines)
+                                + f"\n\n已保存对比结果: {filename}")
+
+    def on_diff_error(self, msg):
+        self._end_diff()
+        QMessageBox.warning(self.ui, "对比失败", f"无法读取文件: {msg}")
+
     def open_latest_excel(self):
         if not current_project:
             QMessageBox.warning(self.ui, "提示", "请先选择项目")
@@ -401,7 +1528,12 @@ class SKCManagerLogic:
         global current_project
         if text and text in projects:
             current_project = text
+            ensure_project_loaded(text)
             self.refresh_table()
+            if self.batch_project is not None and self.batch_project != text:
+                self.clear_batch_preview()
+            if self.history_dialog is not None and self.history_dialog.isVisible():
+                self.refresh_history_dialog()
 
     def create_project_ui(self):
         name, ok = QInputDialog.getText(self.ui, "新建项目", "请输入项目名称（可空，默认 项目N）:")
@@ -415,7 +1547,7 @@ class SKCManagerLogic:
         idx = len(projects) + 1
         folder = f"skc-data-{idx}"
         os.makedirs(folder, exist_ok=True)
-        projects[name] = {"database": {}, "images": {}, "folder": folder}
+        projects[name] = new_project(folder)
         save_project_data(name)
         self.ui.project_combo.addItem(name)
         self.ui.project_combo.setCurrentText(name)
@@ -445,12 +1577,15 @@ class SKCManagerLogic:
         new_name = f"项目{idx}"
         new_folder = f"skc-data-{idx}"
         os.makedirs(new_folder, exist_ok=True)
+        if os.path.isdir(os.path.join(folder, image_store.IMAGE_DIR)):
+            shutil.copytree(os.path.join(folder, image_store.IMAGE_DIR), os.path.join(new_folder, image_store.IMAGE_DIR),
+                            dirs_exist_ok=True)
         try:
             shutil.copy(data_file, os.path.join(new_folder, "data.json"))
         except Exception:
             with open(os.path.join(new_folder, "data.json"), "w", encoding="utf-8") as f:
                 json.dump({"database": data.get("database", {}), "images": data.get("images", {})}, f, ensure_ascii=False, indent=2)
-        projects[new_name] = {"database": data.get("database", {}), "images": data.get("images", {}), "folder": new_folder}
+        projects[new_name] = new_project(new_folder, data.get("database", {}), data.get("images", {}))
         save_project_data(new_name)
         self.ui.project_combo.addItem(new_name)
         self.ui.project_combo.setCurrentText(new_name)
@@ -465,21 +1600,29 @@ class SKCManagerLogic:
         target_folder = QFileDialog.getExistingDirectory(self.ui, "选择导出目标文件夹")
         if not target_folder:
             return
+        self.saver.flush()
         src = projects[current_project]["folder"]
         dst = os.path.join(target_folder, current_project)
         os.makedirs(dst, exist_ok=True)
         try:
-            shutil.copy(os.path.join(src, "data.json"), dst)
-            for f in glob.glob(os.path.join(src, "skc_*.xlsx")):
-                shutil.copy(f, dst)
+            if skc_core.STORAGE_BACKEND == "sqlite":
+                sqlite_store.dump_json(src, os.path.join(dst, "data.json"), status_options)
+            else:
+                shutil.copy(os.path.join(src, "data.json"), dst)
+            for ext in skc_core.EXPORT_FORMATS:
+                for f in glob.glob(os.path.join(src, f"skc_*.{ext}")):
+                    shutil.copy(f, dst)
+            if os.path.isdir(os.path.join(src, image_store.IMAGE_DIR)):
+                shutil.copytree(os.path.join(src, image_store.IMAGE_DIR), os.path.join(dst, image_store.IMAGE_DIR),
+                                dirs_exist_ok=True)
             QMessageBox.information(self.ui, "导出完成", f"已导出到：{dst}")
         except Exception as e:
             QMessageBox.warning(self.ui, "导出失败", f"导出失败: {e}")
 
 # ---------- 启动 ----------
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
-    load_all_projects()
     ui = SKCUI()
     logic = SKCManagerLogic(ui)
     ui.show()
@@ -0,0 +1,111 @@
+import os, json, time, threading
+from collections import deque
+
+# SKC_PERF=1 开启计时；SKC_PERF_LOG=路径 同时写 JSON lines 日志
+ENABLED = os.environ.get("SKC_PERF", "") not in ("", "0")
+LOG_FILE = os.environ.get("SKC_PERF_LOG") or None
+BUFFER_SIZE = 2000
+
+_records = deque(maxlen=BUFFER_SIZE)
+_counters = {}
+_lock = threading.Lock()
+_log = None
+
+
+class timed:
+    """计时上下文：with timed("export.workbook", items=n) as t: ...; t.items / t.bytes 可在块内补充
+
+    关闭时 __enter__/__exit__ 只判断一次开关，几乎没有开销。
+    """
+    __slots__ = ("name", "items", "bytes", "start")
+
+    def __init__(self, name, items=0, nbytes=0):
+        self.name = name
+        self.items = items
+        self.bytes = nbytes
+        self.start = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start, self.items, self.bytes, exc_type is not None)
+        return False
+
+
+def record(name, seconds, items=0, nbytes=0, failed=False):
+    rec = {"name": name, "ts": round(time.time(), 3), "ms": round(seconds * 1000, 3),
+           "items": items, "bytes": nbytes, "thread": threading.current_thread().name}
+    if failed:
+        rec["failed"] = True
+    with _lock:
+        _records.append(rec)
+        if LOG_FILE:
+            _write_log(rec)
+
+
+def count(name, n=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def _write_log(rec):
+    global _log
+    try:
+        if _log is None:
+            _log = open(LOG_FILE, "a", encoding="utf-8")
+        _log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        _log.flush()
+    except Exception:
+        pass
+
+
+def set_enabled(flag):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def set_log_file(path):
+    global LOG_FILE, _log
+    with _lock:
+        if _log is not None:
+            _log.close()
+            _log = None
+        LOG_FILE = path or None
+
+
+def clear():
+    with _lock:
+        _records.clear()
+        _counters.clear()
+
+
+def recent(n=50):
+    with _lock:
+        return list(_records)[-n:]
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def summary():
+    """按名称汇总：次数、总/平均/最大耗时、条数、字节数"""
+    stats = {}
+    with _lock:
+        records = list(_records)
+    for rec in records:
+        s = stats.setdefault(rec["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "items": 0, "bytes": 0})
+        s["count"] += 1
+        s["total_ms"] += rec["ms"]
+        s["max_ms"] = max(s["max_ms"], rec["ms"])
+        s["items"] += rec["items"] or 0
+        s["bytes"] += rec["bytes"] or 0
+    for s in stats.values():
+        s["avg_ms"] = s["total_ms"] / s["count"]
+    return stats
@@ -0,0 +1,89 @@
+from bisect import bisect_left, insort
+
+
+class SKCSearchIndex:
+    """搜索索引：各状态数量 + SKC 有序列表（前缀查找，第一次查找时才排序）
+
+    状态筛选直接扫描 SKCStore 的状态编码，不再为每个状态保存 SKC 集合。
+    """
+
+    def __init__(self, status_options):
+        self.status_options = list(status_options)
+        self.status_counts = {s: 0 for s in self.status_options}
+        self.db = None
+        self.sorted_skcs = None
+        self.pending = []
+
+    def build(self, db):
+        self.db = db
+        self.status_counts = {s: 0 for s in self.status_options}
+        for status, n in db.status_counts().items():
+            self.status_counts[status] = self.status_counts.get(status, 0) + n
+        self.sorted_skcs = None
+        self.pending = []
+
+    def add(self, skc, status):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        # 新增先放到 pending，查询前统一合并排序，避免批量导入时逐个插入
+        if self.sorted_skcs is not None:
+            self.pending.append(skc)
+
+    def change(self, skc, old_status, new_status):
+        if old_status == new_status:
+            return
+        self.status_counts[old_status] -= 1
+        self.status_counts[new_status] = self.status_counts.get(new_status, 0) + 1
+
+    def remove(self, skc, status):
+        self.status_counts[status] -= 1
+        if self.sorted_skcs is None:
+            return
+        if self.pending and skc in self.pending:
+            self.pending.remove(skc)
+            return
+        i = bisect_left(self.sorted_skcs, skc)
+        if i < len(self.sorted_skcs) and self.sorted_skcs[i] == skc:
+            del self.sorted_skcs[i]
+
+    def _merge_pending(self):
+        if self.sorted_skcs is None:
+            self.sorted_skcs = sorted(self.db.index)
+            self.pending = []
+            return
+        if not self.pending:
+            return
+        if len(self.pending) < 64:
+            for skc in self.pending:
+                insort(self.sorted_skcs, skc)
+        else:
+            self.sorted_skcs.extend(self.pending)
+            self.sorted_skcs.sort()
+        self.pending = []
+
+    def prefix(self, prefix):
+        """以 prefix 开头的 SKC 列表"""
+        self._merge_pending()
+        lo = bisect_left(self.sorted_skcs, prefix)
+        hi = bisect_left(self.sorted_skcs, prefix + "\U0010ffff", lo)
+        return self.sorted_skcs[lo:hi]
+
+    def counts(self):
+        """各状态 SKC 数量，status_options 中的状态在前"""
+        return {s: n for s, n in self.status_counts.items() if n or s in self.status_options}
+
+    def query(self, db, index, prefix="", product_text="", statuses=()):
+        """返回满足条件的 SKC 集合；没有任何条件时返回 None（不过滤）"""
+        result = None
+        if prefix:
+            result = set(self.prefix(prefix))
+        if statuses:
+            matched = db.skcs_with_status(statuses)
+            result = matched if result is None else result & matched
+        if product_text:
+            text = product_text.casefold()
+            products = {p for p in db if text in p.casefold()}
+            if result is None:
+                result = {skc for p in products for skc in db[p]}
+            else:
+                result = {skc for skc in result if index.get(skc) in products}
+        return result
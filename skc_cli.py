@@ -0,0 +1,363 @@
+import sys, os, time, argparse
+from concurrent.futures import ProcessPoolExecutor
+import skc_core
+import skc_diff
+import image_store
+import change_log
+
+
+def read_skcs(args):
+    """SKC 来源：命令行参数、-f 文件（- 为标准输入），都没有时读标准输入"""
+    skcs = list(args.skcs)
+    for path in args.file or []:
+        if path == "-":
+            skcs += skc_core.parse_skc_text(sys.stdin.read())
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    skcs += skc_core.parse_skc_text(line)
+    if not skcs and not args.file and not sys.stdin.isatty():
+        skcs = skc_core.parse_skc_text(sys.stdin.read())
+    return skcs
+
+
+def print_not_found(not_found):
+    if not_found:
+        print("未找到 SKC: " + " ".join(not_found), file=sys.stderr)
+
+
+def export(project):
+    result, filename = skc_core.export_project(project["folder"], project["database"], project["images"])
+    if result == "unchanged":
+        print(f"内容与上次导出相同，未生成新文件: {filename}")
+    else:
+        print(f"已保存: {filename}")
+
+
+def cmd_add(project, args):
+    added, new_products = skc_core.add_skcs(project, args.product, read_skcs(args), args.status)
+    skc_core.save_project(project, skcs=added, products=new_products)
+    print(f"新增 {len(added)} 个 SKC（重复自动跳过）")
+    return True
+
+
+def cmd_modify(project, args):
+    modified, not_found = skc_core.modify_skcs(project, read_skcs(args), args.status)
+    skc_core.save_project(project, skcs=modified)
+    print(f"已修改 {len(modified)} 个 SKC 为「{args.status}」")
+    print_not_found(not_found)
+    return True
+
+
+def cmd_delete(project, args):
+    deleted, not_found = skc_core.delete_skcs(project, read_skcs(args))
+    skc_core.save_project(project, deleted=deleted)
+    print(f"已删除 {len(deleted)} 个 SKC")
+    print_not_found(not_found)
+    return True
+
+
+def read_one(path):
+    """读取一个导入文件，返回 (文件, fragment, 错误信息)"""
+    try:
+        return path, skc_core.read_fragment(path), ""
+    except Exception as e:
+        return path, None, str(e)
+
+
+def read_fragments(paths, jobs):
+    """读取多个导入文件，jobs > 1 时用多个进程并行，结果保持文件顺序"""
+    if jobs <= 1 or len(paths) <= 1:
+        return [read_one(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        return list(pool.map(read_one, paths))
+
+
+def cmd_import(project, args):
+    paths = skc_core.expand_import_paths(args.excel)
+    imported, new_products, report = skc_core.merge_fragments(project, read_fragments(paths, args.jobs))
+    if imported or new_products:
+        skc_core.save_project(project, skcs=imported, products=new_products)
+    for path, count, added, error in report:
+        if error:
+            print(f"{path}: 失败 {error}", file=sys.stderr)
+        else:
+            print(f"{path}: 成功导入 {added} 条记录，跳过重复 {count - added} 条")
+    return len(imported) > 0
+
+
+def cmd_adopt_images(project, args):
+    """一次性迁移：旧数据中以绝对路径引用的图片收进项目图片库"""
+    legacy = image_store.legacy_refs(project["images"])
+    adopted = skc_core.adopt_images(project)
+    if adopted:
+        skc_core.save_project(project, image_products=adopted)
+    print(f"已收进图片库 {len(adopted)} 个货号的图片，{len(legacy) - len(adopted)} 个原图不存在或无法读取")
+    return False
+
+
+def cmd_counts(project, args):
+    for product in args.products or project["database"]:
+        counts = skc_core.product_status_counts(project, product)
+        print(product + "\t" + "  ".join(f"{s} {n}" for s, n in counts.items()))
+    return False
+
+
+def cmd_export(project, args):
+    if args.output:
+        skc_core.write_export_file(args.output, project["database"],
+                                   image_store.export_images(project["folder"], project["images"]))
+        print(f"已保存: {args.output}")
+    else:
+        export(project)
+    return False
+
+
+def diff_source(project, source):
+    """"current" 为项目当前数据，"latest" 为最近一次导出的文件，其余为文件/文件夹路径"""
+    if source == "current":
+        return "当前数据", skc_diff.snapshot_of(project["database"])
+    if source == "latest":
+        source = skc_diff.latest_export(project["folder"])
+        if source is None:
+            raise ValueError("项目还没有导出文件")
+    return source, skc_diff.load_snapshot(source)
+
+
+def cmd_diff(project, args):
+    old_name, old = diff_source(project, args.old)
+    new_name, new = diff_source(project, args.new)
+    result = skc_diff.diff(old, new)
+    line = f"{old_name} -> {new_name}: {skc_diff.summary(result)}"
+    if args.output:
+        skc_diff.write_diff(args.output, result, old_name, new_name)
+        print(f"已保存: {args.output}")
+        print(line)
+    else:
+        for row in skc_diff.iter_rows(result):
+            print("\t".join(v or "" for v in row))
+        # 汇总写到标准错误，标准输出只有对比行，方便重定向
+        print(line, file=sys.stderr)
+    return False
+
+
+def cmd_where(project, args):
+    """在同一目录下所有 skc-data-* 项目中查找 SKC（过期的项目先重建索引）"""
+    folder = os.path.abspath(project["folder"])
+    root = os.path.dirname(folder)
+    folders = sorted(os.path.join(root, d) for d in os.listdir(root)
+                     if d.startswith("skc-data-") and os.path.isdir(os.path.join(root, d)))
+    if folder not in folders:
+        folders.append(folder)
+    skc_core.refresh_global_index(folders)
+    skcs = read_skcs(args)
+    found = skc_core.lookup_skcs(folder, skcs)
+    not_found = []
+    for skc in dict.fromkeys(skcs):
+        for folder, product, status in found.get(skc, ()):
+            print(f"{skc}\t{folder}\t{product}\t{status}")
+        if skc not in found:
+            not_found.append(skc)
+    print_not_found(not_found)
+    return False
+
+
+def cmd_batch(project, args):
+    """每行 SKC [状态] 的批量修改/删除；--dry-run 只列出将要做的修改"""
+    statuses = project["database"].statuses
+    entries = []
+    for path in args.file or ["-"]:
+        if path == "-":
+            entries += skc_core.parse_batch_text(sys.stdin.read(), statuses)
+        else:
+            entries += skc_core.read_batch_file(path, statuses)
+    plan = skc_core.plan_batch(project, entries, args.status, args.delete)
+    if args.dry_run:
+        for skc, product, old, new in plan["change"]:
+            print(f"{skc}\t{product}\t{old}\t{new or '删除'}")
+        print(f"将{'删除' if args.delete else '修改'} {len(plan['change'])} 个，状态不变 {len(plan['same'])} 个，"
+              f"重复 {plan['duplicates']} 行", file=sys.stderr)
+        print_not_found(plan["not_found"])
+        return False
+    changed = skc_core.apply_batch(project, plan)
+    if args.delete:
+        skc_core.save_project(project, deleted=changed)
+        print(f"已删除 {len(changed)} 个 SKC")
+    else:
+        skc_core.save_project(project, skcs=changed)
+        print(f"已修改 {len(changed)} 个 SKC 的状态，{len(plan['same'])} 个状态未变")
+    print_not_found(plan["not_found"])
+    return bool(changed)
+
+
+def replay(project, result, verb):
+    """保存撤销/重做/恢复的结果；有冲突且没有 --force 时不修改"""
+    if result is None:
+        print(f"没有可以{verb}的修改")
+        return False
+    if not result["applied"]:
+        print(f"{len(result['conflicts'])} 个 SKC 在记录之后被其他方式修改过，未{verb}（加 --force 仍然{verb}）: "
+              + " ".join(result["conflicts"][:20]), file=sys.stderr)
+        return False
+    skc_core.save_project(project, result["skcs"], result["deleted"], result["products"], result["image_products"])
+    for rec in result["ops"]:
+        print(f"已{verb}: {rec['label']}")
+    return True
+
+
+def cmd_undo(project, args):
+    return replay(project, skc_core.undo_changes(project, args.steps, args.force), "撤销")
+
+
+def cmd_redo(project, args):
+    return replay(project, skc_core.redo_changes(project, args.steps, args.force), "重做")
+
+
+def cmd_restore(project, args):
+    when = None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            when = time.mktime(time.strptime(args.time, fmt))
+            break
+        except ValueError:
+            continue
+    if when is None:
+        raise ValueError(f"无法识别的时间: {args.time}（格式如 2024-05-01 14:30）")
+    return replay(project, skc_core.restore_to(project, when, args.force), "恢复")
+
+
+def cmd_history(project, args):
+    log = change_log.get_log(project["folder"])
+    done, redo = log.entries()
+    if log.checkpoint:
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(log.checkpoint['time']))}\t更早的记录已清理")
+    for i, rec in enumerate(done + redo):
+        mark = "已撤销" if i >= len(done) else ("当前" if i == len(done) - 1 else "")
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(rec['time']))}\t{rec['label']}\t{mark}".rstrip())
+    return False
+
+
+def cmd_query(project, args):
+    if args.all:
+        rows = [(skc, p, s) for p, skcs in project["database"].items() for skc, s in skcs.items()]
+    else:
+        rows = skc_core.query_skcs(project, read_skcs(args))
+    not_found = []
+    for skc, product, status in rows:
+        if product is None:
+            not_found.append(skc)
+        else:
+            print(f"{skc}\t{product}\t{status}")
+    print_not_found(not_found)
+    return False
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SKC 管理器命令行（不需要图形界面）")
+    parser.add_argument("-p", "--project", default="skc-data-1", help="项目文件夹，默认 skc-data-1")
+    parser.add_argument("--storage", choices=["json", "sqlite"], help="存储方式，默认读取环境变量 SKC_STORAGE")
+    parser.add_argument("--export", action="store_true", help="修改后导出一份 Excel（同界面的自动导出）")
+    parser.add_argument("--format", choices=skc_core.EXPORT_FORMATS,
+                        help="导出格式，默认读取环境变量 SKC_EXPORT_FORMAT（xlsx）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def skc_args(p):
+        p.add_argument("skcs", nargs="*", help="SKC；也可用 -f 或标准输入提供")
+        p.add_argument("-f", "--file", action="append", help="SKC 列表文件（空格/换行分隔），- 表示标准输入")
+
+    p = sub.add_parser("add", help="新增 SKC 到货号")
+    p.add_argument("product", help="货号")
+    skc_args(p)
+    p.add_argument("-s", "--status", default=skc_core.status_options[0], help="状态，默认 %(default)s")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("modify", help="批量修改 SKC 状态")
+    skc_args(p)
+    p.add_argument("-s", "--status", required=True, help="新状态")
+    p.set_defaults(func=cmd_modify)
+
+    p = sub.add_parser("delete", help="批量删除 SKC")
+    skc_args(p)
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("import", help="导入 Excel（导出文件格式）或 货号,SKC,状态 的 CSV/TSV")
+    p.add_argument("excel", nargs="+", help="Excel / CSV / TSV 文件或包含它们的文件夹")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="并行读取的进程数，默认 CPU 核数")
+    p.set_defaults(func=cmd_import)
+
+
+    p = sub.add_parser("adopt-images", help="把旧数据中引用外部文件的图片收进项目图片库（一次性迁移）")
+    p.set_defaults(func=cmd_adopt_images)
+
+    p = sub.add_parser("counts", help="各货号各状态 SKC 数量")
+    p.add_argument("products", nargs="*", help="货号，默认全部")
+    p.set_defaults(func=cmd_counts)
+
+    p = sub.add_parser("export", help="导出 Excel / CSV / TSV")
+    p.add_argument("-o", "--output", help="输出文件（按扩展名选格式）；不指定时按时间戳保存到项目文件夹")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("diff", help="对比两个时间点：新增/删除/换货号/状态变化")
+    p.add_argument("old", help="旧数据：data.json、.snapshots 中的快照、data.db、导出文件、项目文件夹，"
+                               "或 latest（最近一次导出）、current（当前数据）")
+    p.add_argument("new", nargs="?", default="current", help="新数据，格式同上，默认 current")
+    p.add_argument("-o", "--output", help="把对比结果写成 Excel（.xlsx）或 CSV/TSV")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("where", help="在同一目录下的所有项目中查找 SKC（跨项目索引）")
+    skc_args(p)
+    p.set_defaults(func=cmd_where)
+
+    p = sub.add_parser("batch", help="按 SKC [状态] 行批量修改状态或删除（一次保存、一步撤销）")
+    p.add_argument("-f", "--file", action="append", help="SKC [状态] 文本文件，- 表示标准输入（默认）")
+    p.add_argument("-s", "--status", default=skc_core.status_options[0], help="没写状态的行使用的状态，默认 %(default)s")
+    p.add_argument("--delete", action="store_true", help="删除列出的 SKC（忽略状态）")
+    p.add_argument("--dry-run", action="store_true", help="只列出将要做的修改")
+    p.set_defaults(func=cmd_batch)
+
+    for name, func, help_text in (("undo", cmd_undo, "撤销最近的修改"), ("redo", cmd_redo, "重做撤销的修改")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("-n", "--steps", type=int, default=1, help="步数，默认 1")
+        p.add_argument("--force", action="store_true", help="SKC 在记录之后被其他方式改过时仍然执行")
+        p.set_defaults(func=func)
+
+    p = sub.add_parser("restore", help="恢复到某一时刻的数据（按修改记录撤销/重做）")
+    p.add_argument("time", help="时间，如 \"2024-05-01 14:30\"")
+    p.add_argument("--force", action="store_true", help="SKC 在记录之后被其他方式改过时仍然执行")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser("history", help="列出修改记录")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("query", help="查询 SKC 所在货号和状态")
+    skc_args(p)
+    p.add_argument("--all", action="store_true", help="列出项目全部 SKC")
+    p.set_defaults(func=cmd_query)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.storage:
+        skc_core.STORAGE_BACKEND = args.storage
+    if args.format:
+        skc_core.EXPORT_FORMAT = args.format
+    if not os.path.isdir(args.project):
+        os.makedirs(args.project, exist_ok=True)
+    try:
+        project = skc_core.load_project(args.project)
+        if project.get("recovered_from"):
+            print(f"警告: 数据文件损坏或缺失，已从快照恢复：{project['recovered_from']}", file=sys.stderr)
+        elif project.get("load_error"):
+            print(f"警告: {project['load_error']}，按空项目处理（原文件已另存为 data.json.corrupt）", file=sys.stderr)
+        changed = args.func(project, args)
+        if changed and args.export:
+            export(project)
+    except Exception as e:
+        print(f"失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
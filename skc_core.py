@@ -0,0 +1,913 @@
+import os, re, csv, json, time, glob, queue, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from itertools import zip_longest, islice
+import sqlite_store
+import export_history
+import image_store
+import global_index
+import change_log
+import perf_stats
+from perf_stats import timed
+from search_index import SKCSearchIndex
+from skc_store import SKCStore, MAX_STATUSES, dump_json
+
+status_options = ["核价通过", "拉过库存", "已下架", "价格待定", "减少库存为0", "改过体积", "价格错误"]
+
+MAX_FILES = 100
+# 超出 MAX_FILES 的旧导出：True 压缩进 exports_archive.zip，False 直接删除
+ARCHIVE_OLD_EXPORTS = False
+# 项目存储方式："json"（data.json 整体写入）或 "sqlite"（data.db 增量写入）
+STORAGE_BACKEND = os.environ.get("SKC_STORAGE", "json")
+# 导出时每写多少行汇报一次进度/检查取消
+EXPORT_ROW_BATCH = 2000
+# 自动导出格式："xlsx"（带图片的 Excel）、"csv" 或 "tsv"（平铺的 货号,SKC,状态 行，快得多）
+EXPORT_FORMATS = ("xlsx", "csv", "tsv")
+EXPORT_FORMAT = os.environ.get("SKC_EXPORT_FORMAT", "xlsx")
+# CSV/TSV 的表头；导入时第一行与它相同则跳过
+FLAT_HEADER = ["货号", "SKC", "状态"]
+# 导入文件夹时读取的文件类型
+IMPORT_EXTENSIONS = (".xlsx", ".xlsm", ".csv", ".tsv", ".txt")
+# 每次写盘后增量更新跨项目 SKC 索引（skc_index.db）；SKC_GLOBAL_INDEX=0 关闭
+GLOBAL_INDEX = os.environ.get("SKC_GLOBAL_INDEX", "1") != "0"
+# 每次修改记入 changes.jsonl，用于撤销/重做；SKC_CHANGE_LOG=0 关闭
+CHANGE_LOG = os.environ.get("SKC_CHANGE_LOG", "1") != "0"
+# data.json 每次写入前把旧文件移到 .snapshots/，保留最近几份用于损坏时恢复
+SNAPSHOT_COUNT = 5
+SNAPSHOT_DIR = ".snapshots"
+
+
+def data_file_name():
+    return sqlite_store.DB_FILE if STORAGE_BACKEND == "sqlite" else "data.json"
+
+
+def parse_skc_text(text):
+    """空格/换行分隔的 SKC 文本 -> SKC 列表"""
+    return [s.strip() for s in str(text).split() if s.strip()]
+
+
+# 批量修改文本一行内的分隔符：空白、中英文逗号/分号（从表格复制出来是制表符）
+BATCH_SEPARATORS = re.compile(r"[\s,，;；]+")
+
+
+def parse_batch_text(text, statuses=()):
+    """批量修改的文本 -> [(SKC, 状态或 None)]
+
+    每行一个或多个 SKC，行末可跟一个状态（statuses 中的名称），对这一行的 SKC 都有效；
+    没写状态的为 None（使用界面选的默认状态）。
+    """
+    known = set(statuses)
+    entries = []
+    for line in str(text).splitlines():
+        tokens = [t for t in BATCH_SEPARATORS.split(line) if t]
+        if not tokens:
+            continue
+        status = tokens.pop() if len(tokens) > 1 and tokens[-1] in known else None
+        entries.extend((skc, status) for skc in tokens)
+    return entries
+
+
+def read_batch_file(path, statuses=()):
+    """SKC [状态] 文本文件 -> parse_batch_text 的结果"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_batch_text(f.read(), statuses)
+
+
+# ---------- 项目数据 ----------
+def build_skc_index(project):
+    """数据转为紧凑存储 SKCStore，建立 SKC -> 货号 索引视图（查重/查找 O(1)）和搜索索引"""
+    if not isinstance(project["database"], SKCStore):
+        project["database"] = SKCStore(project["database"], status_options)
+    index = project["database"].skc_index()
+    project["index"] = index
+    search = SKCSearchIndex(status_options)
+    search.build(project["database"])
+    project["search"] = search
+    return index
+
+
+def new_project(folder, database=None, images=None):
+    project = {"database": database or {}, "images": images or {}, "folder": folder, "loaded": True}
+    build_skc_index(project)
+    project["skc_count"] = len(project["index"])
+    return project
+
+
+def snapshot_files(folder):
+    """.snapshots/ 中的 data.json 快照，旧的在前"""
+    return sorted(glob.glob(os.path.join(folder, SNAPSHOT_DIR, "data_*.json")))
+
+
+def _read_json_data(project):
+    """读取 data.json；损坏或缺失时按新到旧尝试快照
+
+    data.json 损坏时改名为 data.json.corrupt 保留，避免之后的保存把它当成快照或覆盖掉。
+    从快照恢复时 project["recovered_from"] 为快照路径；都读不了时 project["load_error"] 为原因。
+    """
+    folder = project["folder"]
+    data_file = os.path.join(folder, "data.json")
+    error = None
+    if os.path.exists(data_file):
+        try:
+            with open(data_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            error = f"data.json 读取失败：{e}"
+            try:
+                os.replace(data_file, data_file + ".corrupt")
+            except OSError:
+                pass
+    for path in reversed(snapshot_files(folder)):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        project["recovered_from"] = path
+        return data
+    if error:
+        project["load_error"] = error
+    return {}
+
+
+def read_project_data(project):
+    """从磁盘读取项目数据并重建索引；文件不存在时为空项目，data.json 损坏时从快照恢复"""
+    project["database"], project["images"] = {}, {}
+    if STORAGE_BACKEND == "sqlite":
+        try:
+            sqlite_store.migrate_json(project["folder"])
+            project["database"], project["images"] = sqlite_store.load(project["folder"], status_options)
+        except Exception as e:
+            project["load_error"] = f"data.db 读取失败：{e}"
+    else:
+        data = _read_json_data(project)
+        project["database"] = data.get("database", {})
+        project["images"] = data.get("images", {})
+    build_skc_index(project)
+    project["loaded"] = True
+    project["skc_count"] = len(project["index"])
+    return project
+
+
+def load_project(folder):
+    return read_project_data({"folder": folder})
+
+
+def prepare_save(project, skcs=None, deleted=None, products=None, image_products=None, copy=True):
+    """在修改数据的线程里取出写盘需要的数据，返回写入任务，交给 write_prepared（可在其他线程执行）
+
+    传入变化的 SKC/货号/图片时取出这些行（sqlite 只写这些行，跨项目索引只更新这些 SKC），否则整体重写；
+    json 模式总是整体写入 data.json，copy=True 时复制一份数据快照，写盘期间界面可以继续修改。
+    """
+    job = {"backend": STORAGE_BACKEND, "folder": project["folder"]}
+    if not (skcs is None and deleted is None and products is None and image_products is None):
+        db, imgs = project["database"], project["images"]
+        job["rows"] = [(s, db.product_of(s), db.status_of(s)) for s in dict.fromkeys(skcs or ()) if s in db.index]
+        job["deleted"] = list(deleted or ())
+        job["products"] = list(products or ())
+        job["image_rows"] = [(p, imgs.get(p)) for p in dict.fromkeys(image_products or ())]
+    if STORAGE_BACKEND != "sqlite" or "rows" not in job:
+        job["database"] = project["database"].copy() if copy else project["database"]
+        job["images"] = dict(project["images"]) if copy else project["images"]
+    project["skc_count"] = len(project["index"])
+    project["mtime"] = time.time()
+    return job
+
+
+def write_prepared(job):
+    """执行 prepare_save 返回的写入任务。失败时抛出异常，磁盘上仍是上一次完整写入的数据"""
+    folder = job["folder"]
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    if job["backend"] == "sqlite":
+        if "rows" in job:
+            changed = len(job["rows"]) + len(job["deleted"]) + len(job["products"]) + len(job["image_rows"])
+            with timed("save.sqlite_changes", changed):
+                sqlite_store.save_changes(folder, job["rows"], job["deleted"], job["products"], job["image_rows"])
+        else:
+            with timed("save.sqlite_all", len(job["database"].index)):
+                sqlite_store.save_all(folder, job["database"], job["images"])
+    else:
+        with timed("save.json", len(job["database"].index)) as t:
+            t.bytes = write_json_atomic(folder, job["database"], job["images"])
+    try:
+        change_log.write(folder)
+    except OSError:
+        # 修改记录留在内存里，下次保存时再写
+        pass
+    if GLOBAL_INDEX:
+        update_global_index(job)
+
+
+def update_global_index(job):
+    """数据写盘后更新跨项目索引；失败不影响保存，丢弃该项目的签名让下次启动时重建"""
+    folder = job["folder"]
+    data_file = sqlite_store.DB_FILE if job["backend"] == "sqlite" else "data.json"
+    try:
+        if "rows" in job:
+            with timed("index.apply", len(job["rows"]) + len(job["deleted"])):
+                global_index.apply(folder, data_file, job["rows"], job["deleted"])
+        else:
+            with timed("index.replace", len(job["database"].index)):
+                global_index.replace(folder, data_file, job["database"])
+    except Exception:
+        global_index.forget(folder)
+
+
+def refresh_global_index(folders, should_stop=None):
+    """重建索引过期的项目（第一次使用、或在程序外修改过），只读取这些项目的数据；返回重建的文件夹"""
+    return global_index.refresh(list(folders), data_file_name(), lambda folder: load_project(folder)["database"],
+                                should_stop)
+
+
+def lookup_skcs(folder, skcs, exclude_self=False):
+    """在与 folder 同一目录下的所有项目中查找 SKC；返回 {SKC: [(项目文件夹名, 货号, 状态)]}"""
+    return global_index.lookup(global_index.root_of(folder), skcs, folder if exclude_self else None)
+
+
+def write_json_atomic(folder, database, images):
+    """写 data.json：先写临时文件并 fsync，旧文件移入快照目录，再改名替换；返回写入字节数
+
+    任何时刻崩溃，磁盘上都有一份完整的 data.json 或快照（读取时自动恢复）。
+    """
+    data_file = os.path.join(folder, "data.json")
+    tmp_file = data_file + ".tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            dump_json(f, database, images)
+            size = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
+    if SNAPSHOT_COUNT > 0 and os.path.exists(data_file):
+        snap_dir = os.path.join(folder, SNAPSHOT_DIR)
+        os.makedirs(snap_dir, exist_ok=True)
+        now = time.time()
+        name = time.strftime("data_%Y%m%d_%H%M%S", time.localtime(now)) + f"_{int(now * 1000) % 1000:03d}.json"
+        os.replace(data_file, os.path.join(snap_dir, name))
+    os.replace(tmp_file, data_file)
+    _fsync_dir(folder)
+    for old in snapshot_files(folder)[:-SNAPSHOT_COUNT or None]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return size
+
+
+def _fsync_dir(folder):
+    """改名后同步目录项（Windows 不支持打开目录，跳过）"""
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def save_project(project, skcs=None, deleted=None, products=None, image_products=None):
+    """在当前线程直接保存项目（命令行等不需要后台写盘的地方）。失败时抛出异常"""
+    write_prepared(prepare_save(project, skcs, deleted, products, image_products, copy=False))
+
+
+# ---------- 修改记录 / 撤销 ----------
+def group_changes(rows):
+    """[(原货号, 原状态, 新货号, 新状态, SKC)] -> 按前后状态分组，批量修改通常只有几组"""
+    groups = {}
+    for old_p, old_s, new_p, new_s, skc in rows:
+        groups.setdefault((old_p, old_s, new_p, new_s), []).append(skc)
+    return [(*key, skcs) for key, skcs in groups.items()]
+
+
+def record_change(project, label, groups=(), images=()):
+    """把一次修改记入项目的修改记录（随下一次保存写入 changes.jsonl）"""
+    if not CHANGE_LOG or not (groups or images):
+        return
+    with timed("changes.record", sum(len(g[4]) for g in groups)):
+        rec = change_log.change_record(label, groups, images, len(project["index"]))
+        change_log.get_log(project["folder"]).record(rec)
+
+
+def state_of(db, skc):
+    v = db.product_of(skc)
+    return None if v is None else (v, db.status_of(skc))
+
+
+def find_conflicts(project, wanted, expected):
+    """记录之后又被其他方式改过的 SKC：当前既不是记录中的状态，也不是要恢复成的状态"""
+    db = project["database"]
+    conflicts = []
+    for skc, before in expected.items():
+        now = state_of(db, skc)
+        if now != before and now != wanted[skc]:
+            conflicts.append(skc)
+    return conflicts
+
+
+def apply_states(project, wanted):
+    """把 SKC 改成 {SKC: (货号, 状态) 或 None(删除)}，已经是目标状态的跳过
+
+    返回 (新增或修改的 SKC, 删除的 SKC, 新增的货号)，用于保存。
+    """
+    db, search = project["database"], project["search"]
+    gone = [skc for skc, target in wanted.items() if target is None and skc in db.index]
+    for skc, status in zip(gone, db.remove_many(gone)):
+        search.remove(skc, status)
+    changed, new_products = [], []
+    by_status = {}
+    for skc, target in wanted.items():
+        if target is None:
+            continue
+        product, status = target
+        current = db.product_of(skc)
+        if current == product:
+            if db.status_of(skc) != status:
+                by_status.setdefault(status, []).append(skc)
+            continue
+        if current is not None:
+            search.remove(skc, db.remove(skc))
+        if product not in db:
+            new_products.append(product)
+        db.add(product, skc, status)
+        search.add(skc, status)
+        changed.append(skc)
+    for status, skcs in by_status.items():
+        for skc, old in zip(skcs, db.set_status_many(skcs, status)):
+            search.change(skc, old, status)
+        changed += skcs
+    return changed, gone, new_products
+
+
+def undo_changes(project, steps=1, force=False):
+    """撤销最近 steps 步修改；见 replay_changes"""
+    return replay_changes(project, "undo", steps, force)
+
+
+def redo_changes(project, steps=1, force=False):
+    """重做最近撤销的 steps 步修改；见 replay_changes"""
+    return replay_changes(project, "redo", steps, force)
+
+
+def replay_changes(project, direction, steps=1, force=False):
+    """按修改记录把数据改回去（undo）或再改一次（redo），多步合并成一次修改，不读取任何旧文件
+
+    没有可撤销/重做的修改时返回 None；否则返回 {"ops", "conflicts", "applied"}，
+    applied 时还有 skcs/deleted/products/image_products（交给保存）。
+    有 SKC 在记录之后被其他方式改过（conflicts）且 force=False 时不做修改。
+    """
+    log = change_log.get_log(project["folder"])
+    ops = log.peek(direction, steps)
+    if not ops:
+        return None
+    with timed(f"changes.{direction}") as t:
+        wanted, expected, images = change_log.targets(ops, direction)
+        t.items = len(wanted)
+        result = {"ops": ops, "conflicts": find_conflicts(project, wanted, expected), "applied": False}
+        if result["conflicts"] and not force:
+            return result
+        skcs, deleted, products = apply_states(project, wanted)
+        for product, ref in images.items():
+            if ref:
+                project["images"][product] = ref
+            else:
+                project["images"].pop(product, None)
+        log.record({"op": direction, "ids": [rec["id"] for rec in ops], "time": time.time(),
+                    "count": len(project["index"])})
+    result.update(applied=True, skcs=skcs, deleted=deleted, products=products, image_products=list(images))
+    return result
+
+
+def restore_to(project, when, force=False):
+    """恢复到 when（时间戳）时的数据：撤销那之后的修改，或重做那之前已撤销的修改"""
+    done, redo = change_log.get_log(project["folder"]).entries()
+    later = sum(1 for rec in done if rec["time"] > when)
+    if later:
+        return undo_changes(project, later, force)
+    return redo_changes(project, sum(1 for rec in redo if rec["time"] <= when), force)
+
+
+# ---------- 增删改查 ----------
+def add_skcs(project, product, skcs, status):
+    """新增 SKC 到货号，已存在的 SKC 跳过；返回 (新增的 SKC, 新增的货号)"""
+    db, search = project["database"], project["search"]
+    new_products = []
+    if product not in db:
+        db.add_product(product)
+        new_products.append(product)
+    added = []
+    for skc in skcs:
+        s = str(skc).strip()
+        if not s or not db.add(product, s, status):
+            continue
+        search.add(s, status)
+        added.append(s)
+    if added:
+        record_change(project, f"新增 {len(added)} 个 SKC 到 {product}", [(None, None, product, status, added)])
+    return added, new_products
+
+
+def modify_skcs(project, skcs, status):
+    """修改 SKC 状态；返回 (已修改, 未找到)"""
+    db, search = project["database"], project["search"]
+    modified = []
+    not_found = []
+    rows = []
+    skcs = [str(skc).strip() for skc in skcs]
+    for s, old in zip(skcs, db.set_status_many(skcs, status)):
+        if old is None:
+            not_found.append(s)
+            continue
+        search.change(s, old, status)
+        modified.append(s)
+        if old != status:
+            product = db.product_of(s)
+            rows.append((product, old, product, status, s))
+    record_change(project, f"修改 {len(modified)} 个 SKC 为「{status}」", group_changes(rows))
+    return modified, not_found
+
+
+def delete_skcs(project, skcs):
+    """删除 SKC；返回 (已删除, 未找到)"""
+    db, search = project["database"], project["search"]
+    deleted = []
+    not_found = []
+    skcs = [str(skc).strip() for skc in skcs]
+    products = [db.product_of(s) for s in skcs]
+    rows = []
+    for s, product, status in zip(skcs, products, db.remove_many(skcs)):
+        if status is None:
+            not_found.append(s)
+            continue
+        search.remove(s, status)
+        deleted.append(s)
+        rows.append((product, status, None, None, s))
+    record_change(project, f"删除 {len(deleted)} 个 SKC", group_changes(rows))
+    return deleted, not_found
+
+
+def plan_batch(project, entries, default_status=None, delete=False):
+    """按 SKC 一次查完批量修改/删除的目标，不修改数据
+
+    entries 为 parse_batch_text 的结果，同一 SKC 出现多次时以最后一次为准。返回
+    {"change": [(SKC, 货号, 原状态, 新状态)], "same": [...状态已经是目标的], "not_found": [SKC],
+     "duplicates": 重复行数, "delete": delete}；删除时找到的 SKC 都在 change 中，新状态为 None。
+    """
+    db = project["database"]
+    wanted = {}
+    for skc, status in entries:
+        wanted[skc] = status or default_status
+    plan = {"change": [], "same": [], "not_found": [], "duplicates": len(entries) - len(wanted), "delete": delete}
+    with timed("batch.plan", len(wanted)):
+        for skc, status in wanted.items():
+            product = db.product_of(skc)
+            if product is None:
+                plan["not_found"].append(skc)
+                continue
+            old = db.status_of(skc)
+            if delete:
+                plan["change"].append((skc, product, old, None))
+            elif old == status:
+                plan["same"].append((skc, product, old, status))
+            else:
+                plan["change"].append((skc, product, old, status))
+    return plan
+
+
+def apply_batch(project, plan):
+    """一次应用 plan_batch 的结果（记为一步修改）；返回修改或删除的 SKC。plan 应在应用前刚刚算出"""
+    if plan["delete"]:
+        deleted, _ = delete_skcs(project, [row[0] for row in plan["change"]])
+        return deleted
+    with timed("batch.apply", len(plan["change"])):
+        changed, _, _ = apply_states(project, {skc: (product, new) for skc, product, _, new in plan["change"]})
+    statuses = {row[3] for row in plan["change"]}
+    label = (f"修改 {len(changed)} 个 SKC 为「{statuses.pop()}」" if len(statuses) == 1
+             else f"批量修改 {len(changed)} 个 SKC 的状态")
+    record_change(project, label, group_changes((product, old, product, new, skc)
+                                                for skc, product, old, new in plan["change"]))
+    return changed
+
+
+def product_status_counts(project, product):
+    """货号内各状态 SKC 数量；货号不存在时为空"""
+    db = project["database"]
+    return db[product].status_counts() if product in db else {}
+
+
+def set_image(project, product, path):
+    """图片复制进项目图片库（按内容去重并生成导出用缩略图），货号记录图片库中的相对路径"""
+    old = project["images"].get(product)
+    project["images"][product] = image_store.add(project["folder"], path)
+    if project["images"][product] != old:
+        record_change(project, f"{product} 的图片", images=[(product, old, project["images"][product])])
+
+
+def adopt_images(project):
+    """旧数据里以绝对路径引用的图片收进图片库；返回有变化的货号（需要保存）"""
+    return image_store.adopt_external(project["folder"], project["images"])
+
+
+def query_skcs(project, skcs):
+    """查找 SKC 所在货号和状态；返回 [(SKC, 货号或 None, 状态或 None)]"""
+    db = project["database"]
+    result = []
+    for skc in skcs:
+        s = str(skc).strip()
+        result.append((s, db.product_of(s), db.status_of(s)))
+    return result
+
+
+def merge_fragment(project, fragment):
+    """把导入结果合并进项目，已存在的 SKC 跳过；返回 (新增的 SKC, 新增的货号)"""
+    added = {}
+    imported, new_products = _merge(project, fragment, added)
+    record_change(project, f"导入 {len(imported)} 个 SKC", [(None, None, p, s, skcs) for (p, s), skcs in added.items()])
+    return imported, new_products
+
+
+def check_statuses(db, fragment):
+    """导入结果中的新状态加上已有状态超过 MAX_STATUSES 种时报错（状态列多半是价格、时间等其他内容）"""
+    new = {status for skcs in fragment.values() for status in skcs.values() if status not in db.codes}
+    if len(db.statuses) + len(new) > MAX_STATUSES:
+        raise ValueError(f"状态列有 {len(new)} 种新值，超过上限 {MAX_STATUSES} 种，请检查第三列/状态列是否为状态")
+
+
+def _merge(project, fragment, added):
+    """合并一个导入结果，返回 (新增的 SKC, 新增的货号)；新增的 SKC 按 (货号, 状态) 记入 added
+
+    状态种类超出上限时整个文件不合并（ValueError）。
+    """
+    db, search = project["database"], project["search"]
+    check_statuses(db, fragment)
+    imported = []
+    new_products = []
+    with timed("import.merge") as t:
+        for product, skcs in fragment.items():
+            if product not in db:
+                db.add_product(product)
+                new_products.append(product)
+            for skc, status in skcs.items():
+                if not db.add(product, skc, status):
+                    continue
+                search.add(skc, status)
+                imported.append(skc)
+                added.setdefault((product, status), []).append(skc)
+        t.items = len(imported)
+    return imported, new_products
+
+
+def merge_fragments(project, results):
+    """按文件顺序合并多个导入结果（先出现的文件优先），已存在的 SKC 跳过
+
+    results: [(文件, fragment, 错误信息)]，读取失败的 fragment 为 None。
+    返回 (新增的 SKC, 新增的货号, 报告)；报告每个文件一项 (文件, 读取条数, 新增条数, 错误信息)。
+    """
+    imported, new_products, report, added = [], [], [], {}
+    for path, fragment, error in results:
+        if fragment is None:
+            report.append((path, 0, 0, error or "未读取"))
+            continue
+        try:
+            merged, products = _merge(project, fragment, added)
+        except ValueError as e:
+            report.append((path, sum(len(skcs) for skcs in fragment.values()), 0, str(e)))
+            continue
+        imported += merged
+        new_products += products
+        report.append((path, sum(len(skcs) for skcs in fragment.values()), len(merged), ""))
+    # 多个文件一起导入算一步修改，撤销时一起撤销
+    record_change(project, f"导入 {len(report)} 个文件共 {len(imported)} 个 SKC",
+                  [(None, None, p, s, skcs) for (p, s), skcs in added.items()])
+    return imported, new_products, report
+
+
+# ---------- Excel / CSV ----------
+def expand_import_paths(paths):
+    """文件夹展开为其中的 Excel/CSV/TSV 文件（不含子文件夹和 ~$ 开头的临时文件），按文件名排序；去掉重复"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if not name.startswith("~$") and os.path.splitext(name)[1].lower() in IMPORT_EXTENSIONS
+                            and os.path.isfile(os.path.join(path, name)))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def run_in_pool(worker, jobs, on_progress=None, should_stop=None, max_workers=None, on_done=None):
+    """用 spawn 进程池并行执行 worker(*args, queue, stop_event)，jobs 为 {键: args}
+
+    worker 把进度以 (键, 百分比) 放入 queue，stop_event 置位时应尽快返回。
+    每 0.2 秒轮询一次：should_stop() 为 True 时置位 stop_event，on_progress({键: 百分比}) 汇报进度，
+    on_done(键, 结果, 错误信息) 按完成顺序逐个汇报。返回 {键: (结果, 错误信息)}，出错的结果为 None。
+    """
+    results = {}
+    percents = dict.fromkeys(jobs, 0)
+    # spawn：不 fork 带 Qt 线程的界面进程，各平台行为一致
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ctx.Manager() as manager:
+            progress_queue = manager.Queue()
+            stop_event = manager.Event()
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+                futures = {pool.submit(worker, *args, progress_queue, stop_event): key for key, args in jobs.items()}
+                remaining = set(futures)
+                while remaining:
+                    done, remaining = wait(remaining, timeout=0.2)
+                    if should_stop and should_stop():
+                        stop_event.set()
+                    while True:
+                        try:
+                            key, percent = progress_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        percents[key] = max(percents[key], percent)
+                    for future in done:
+                        key = futures[future]
+                        percents[key] = 100
+                        try:
+                            results[key] = (future.result(), "")
+                        except Exception as e:
+                            results[key] = (None, str(e))
+                        if on_done:
+                            on_done(key, *results[key])
+                    if on_progress:
+                        on_progress(percents)
+    except Exception as e:
+        for key in jobs:
+            if key not in results:
+                results[key] = (None, str(e))
+                if on_done:
+                    on_done(key, *results[key])
+    return results
+
+
+def import_worker(path, queue, stop_event):
+    """进程池任务：读取一个导入文件，进度以 (文件, 百分比) 放入 queue；返回同 read_fragment"""
+    return read_fragment(path, lambda percent: queue.put((path, percent)), stop_event.is_set)
+
+
+
+def flat_delimiter(file_path):
+    """.tsv/.txt 为制表符分隔，其余按逗号"""
+    return "\t" if os.path.splitext(file_path)[1].lower() in (".tsv", ".txt") else ","
+
+
+def read_fragment(file_path, progress=None, should_stop=None):
+    """按扩展名读取 Excel 或 CSV/TSV，返回 {货号: {SKC: 状态}}；取消时返回 None"""
+    if os.path.splitext(file_path)[1].lower() in (".csv", ".tsv", ".txt"):
+        return read_flat_fragment(file_path, progress, should_stop)
+    return read_workbook_fragment(file_path, progress, should_stop)
+
+
+def read_flat_fragment(file_path, progress=None, should_stop=None):
+    """流式读取 货号,SKC,状态 三列的 CSV/TSV（可带表头），去重规则与 Excel 导入相同
+
+    每 EXPORT_ROW_BATCH 行检查一次取消、按已读字节汇报进度；should_stop() 返回 True 时返回 None。
+    """
+    fragment = {}
+    total = os.path.getsize(file_path) or 1
+    percent = 0
+    with timed("import.read", nbytes=total) as span:
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f, delimiter=flat_delimiter(file_path))
+            product, skcs = None, None
+            while True:
+                rows = list(islice(reader, EXPORT_ROW_BATCH))
+                if not rows:
+                    break
+                if should_stop and should_stop():
+                    return None
+                for row in rows:
+                    if len(row) < 3 or row == FLAT_HEADER:
+                        continue
+                    p, skc, status = row[0].strip(), row[1].strip(), row[2]
+                    if not p or not skc or not status:
+                        continue
+                    if p != product:
+                        product, skcs = p, fragment.setdefault(p, {})
+                    if skc not in skcs:
+                        skcs[skc] = status
+                if progress and int(f.buffer.tell() / total * 100) > percent:
+                    percent = min(int(f.buffer.tell() / total * 100), 99)
+                    progress(percent)
+        if should_stop and should_stop():
+            return None
+        if progress:
+            progress(100)
+        span.items = sum(len(skcs) for skcs in fragment.values())
+    return fragment
+
+
+def write_flat(filename, db, delimiter=",", progress=None, should_stop=None):
+    """流式写出 货号,SKC,状态 的 CSV/TSV（UTF-8 带 BOM，Excel 可直接打开），每批 EXPORT_ROW_BATCH 行
+
+    顺序与 Excel 导出相同（按货号、货号内按状态）；不含图片。should_stop() 返回 True 时中止并返回 False。
+    """
+    total = sum(len(skcs) for skcs in db.values()) or 1
+    done = 0
+    with timed("export.rows", total) as t:
+        with open(filename, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(FLAT_HEADER)
+            for product, skcs in db.items():
+                items = iter(skcs.items())
+                while True:
+                    rows = [(product, skc, status) for skc, status in islice(items, EXPORT_ROW_BATCH)]
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    done += len(rows)
+                    if should_stop and should_stop():
+                        return False
+                    if progress:
+                        progress(int(done / total * 100))
+            t.bytes = f.tell()
+    if progress:
+        progress(100)
+    return True
+
+
+def write_export_file(filename, db, imgs, progress=None, should_stop=None):
+    """按扩展名写出 Excel 或 CSV/TSV"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".csv", ".tsv", ".txt"):
+        return write_flat(filename, db, flat_delimiter(filename), progress, should_stop)
+    return write_workbook(filename, db, imgs, progress, should_stop)
+
+
+def read_workbook_fragment(file_path, progress=None, should_stop=None):
+    """read_only 模式逐行读取导出格式的 Excel（货号在第 1 行，SKC/状态 从第 4 行起每两列一组）
+
+    返回 {货号: {SKC: 状态}}；should_stop() 返回 True 时返回 None。
+    """
+    from openpyxl import load_workbook
+    with timed("import.read", nbytes=os.path.getsize(file_path)) as span:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return _read_fragment(wb, span, progress, should_stop)
+        finally:
+            wb.close()
+
+
+def _read_fragment(wb, span, progress, should_stop):
+    fragment = {}
+    total = sum(ws.max_row or 0 for ws in wb.worksheets) or 1
+    done = 0
+    percent = 0
+    for ws in wb.worksheets:
+        columns = []
+        for r, row in enumerate(ws.iter_rows(values_only=True), 1):
+            if should_stop and should_stop():
+                return None
+            done += 1
+            if progress and int(done / total * 100) > percent:
+                percent = min(int(done / total * 100), 99)
+                progress(percent)
+            if r == 1:
+                for col in range(0, len(row), 2):
+                    if row[col]:
+                        product = str(row[col])
+                        columns.append((col, fragment.setdefault(product, {})))
+                continue
+            if r < 4:
+                continue
+            for col, skcs in columns:
+                if col + 1 >= len(row):
+                    continue
+                skc, status = row[col], row[col+1]
+                if skc and status:
+                    s_skc = str(skc).strip()
+                    if s_skc not in skcs:
+                        skcs[s_skc] = str(status)
+    if should_stop and should_stop():
+        return None
+    if progress:
+        progress(100)
+    span.items = sum(len(skcs) for skcs in fragment.values())
+    return fragment
+
+
+def write_workbook(filename, db, imgs, progress=None, should_stop=None):
+    """流式写出 Excel（openpyxl write_only），内存占用与 SKC 数量无关
+
+    布局：第 1 行货号（合并两列），第 2 行图片，第 3 行 SKC/状态 表头，第 4 行起每个货号占两列。
+    progress(percent) 按行批次回调；should_stop() 返回 True 时中止并返回 False。
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.drawing.image import Image as XLImage
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    products = list(db.keys())
+    has_image = False
+    # 列宽、合并单元格、图片都要在写入第一行之前设置
+    with timed("export.images") as t:
+        for i, product in enumerate(products):
+            col = i * 2 + 1
+            ws.merged_cells.add(f"{get_column_letter(col)}1:{get_column_letter(col+1)}1")
+            if product in imgs and imgs[product]:
+                try:
+                    img = XLImage(imgs[product])
+                    img.width = 100
+                    img.height = 100
+                    ws.add_image(img, f"{get_column_letter(col)}2")
+                    ws.column_dimensions[get_column_letter(col)].width = 15
+                    has_image = True
+                    t.items += 1
+                    perf_stats.count("export.images")
+                except Exception:
+                    pass
+    if has_image:
+        ws.row_dimensions[2].height = 80
+
+    header = []
+    for product in products:
+        header += [product, None]
+    ws.append(header)
+    ws.append([])
+    ws.append(["SKC", "状态"] * len(products))
+
+    total = max((len(skcs) for skcs in db.values()), default=0) or 1
+    columns = [iter(skcs.items()) for skcs in db.values()]
+    with timed("export.rows", sum(len(skcs) for skcs in db.values())):
+        for r, cells in enumerate(zip_longest(*columns), 1):
+            row = []
+            for item in cells:
+                row += item if item else (None, None)
+            ws.append(row)
+            if r % EXPORT_ROW_BATCH == 0:
+                if should_stop and should_stop():
+                    return False
+                if progress:
+                    progress(int(r / total * 100))
+
+    if should_stop and should_stop():
+        return False
+    with timed("export.save") as t:
+        wb.save(filename)
+        t.bytes = os.path.getsize(filename)
+    if progress:
+        progress(100)
+    return True
+
+
+def export_project(folder, db, imgs, progress=None, should_stop=None):
+    """按 EXPORT_FORMAT 导出一份带时间戳的 Excel/CSV/TSV 到项目文件夹，并登记到导出记录
+
+    返回 (结果, 文件名)：结果为 "saved"、"unchanged"（内容与上次相同，文件名为上次的文件）或 "canceled"。
+    """
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+
+    history = export_history.get_history(folder)
+    digest = export_history.content_hash(db, imgs, EXPORT_FORMAT)
+    if history.is_unchanged(digest):
+        return "unchanged", history.latest_path()
+    history.rotate(MAX_FILES, ARCHIVE_OLD_EXPORTS)
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    filename = os.path.join(folder, f"skc_{timestamp}.{EXPORT_FORMAT}")
+
+    # 先写临时文件再替换，取消或出错时不会留下写了一半的文件
+    tmp_file = filename + ".part"
+    try:
+        if EXPORT_FORMAT == "xlsx":
+            written = write_workbook(tmp_file, db, image_store.export_images(folder, imgs), progress, should_stop)
+        else:
+            written = write_flat(tmp_file, db, "\t" if EXPORT_FORMAT == "tsv" else ",", progress, should_stop)
+        if not written:
+            return "canceled", None
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    history.record(filename, sum(len(skcs) for skcs in db.values()), digest)
+    return "saved", filename
+
+
+def export_settings():
+    """子进程（spawn）不继承运行时修改的模块设置，随任务一起传过去"""
+    return STORAGE_BACKEND, MAX_FILES, ARCHIVE_OLD_EXPORTS, EXPORT_FORMAT
+
+
+def export_worker(name, folder, snapshot, settings, queue, stop_event):
+    """进程池任务：导出一个项目，进度以 (项目名, 百分比) 放入 queue
+
+    snapshot 为 (database, images)；None 时项目未加载，由子进程自己从磁盘读取。
+    返回同 export_project。
+    """
+    global STORAGE_BACKEND, MAX_FILES, ARCHIVE_OLD_EXPORTS, EXPORT_FORMAT
+    STORAGE_BACKEND, MAX_FILES, ARCHIVE_OLD_EXPORTS, EXPORT_FORMAT = settings
+    if snapshot is None:
+        project = load_project(folder)
+        snapshot = project["database"], project["images"]
+    db, imgs = snapshot
+    return export_project(folder, db, imgs, lambda percent: queue.put((name, percent)), stop_event.is_set)
+
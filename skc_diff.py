@@ -0,0 +1,118 @@
+import os, csv, json, time
+import skc_core
+import sqlite_store
+import export_history
+from perf_stats import timed
+
+# 对比结果表格的列
+DIFF_HEADER = ["变化", "SKC", "原货号", "新货号", "原状态", "新状态"]
+KIND_LABELS = {"added": "新增", "removed": "删除", "moved": "换货号", "status": "状态变化"}
+
+
+def snapshot_of(database):
+    """{货号: {SKC: 状态}}（或 SKCStore）-> {SKC: (货号, 状态)}；同一 SKC 出现多次时以第一次为准"""
+    result = {}
+    for product, skcs in database.items():
+        for skc, status in skcs.items():
+            if skc not in result:
+                result[skc] = (product, status)
+    return result
+
+
+def project_data_file(folder):
+    """项目文件夹中的数据文件：按当前存储方式优先 data.db 或 data.json，另一种作为后备"""
+    names = ["data.json", sqlite_store.DB_FILE]
+    if skc_core.STORAGE_BACKEND == "sqlite":
+        names.reverse()
+    for name in names:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+    raise ValueError(f"{folder} 中没有 data.json 或 {sqlite_store.DB_FILE}")
+
+
+def load_snapshot(source):
+    """读取一个时间点的数据，返回 {SKC: (货号, 状态)}
+
+    source 可以是项目文件夹（磁盘上的当前数据）、data.json 或 .snapshots 中的快照、data.db、
+    导出的 Excel / CSV / TSV。只读：不迁移、不建表、读取失败时直接报错（不从快照恢复或改名）。
+    """
+    if os.path.isdir(source):
+        source = project_data_file(source)
+    with timed("diff.load", nbytes=os.path.getsize(source) if os.path.isfile(source) else 0) as t:
+        if source.lower().endswith(".json"):
+            with open(source, "r", encoding="utf-8") as f:
+                database = json.load(f).get("database", {})
+        elif os.path.basename(source) == sqlite_store.DB_FILE:
+            database = sqlite_store.load_readonly(source)
+        else:
+            database = skc_core.read_fragment(source)
+        snapshot = snapshot_of(database)
+        t.items = len(snapshot)
+    return snapshot
+
+
+def latest_export(folder):
+    """项目最近一次导出的文件，没有则 None"""
+    path = export_history.get_history(folder).latest_path()
+    return path if path and os.path.exists(path) else None
+
+
+def diff(old, new):
+    """对比两个 {SKC: (货号, 状态)}，按 SKC 哈希查找，两边各遍历一次
+
+    返回 {"added": [...], "removed": [...], "moved": [...], "status": [...]}，
+    每项为 (SKC, 原货号, 新货号, 原状态, 新状态)，不存在的一边为 None；
+    换了货号的 SKC 只记在 moved 中（状态也变了时原/新状态不同）。
+    """
+    result = {kind: [] for kind in KIND_LABELS}
+    added, moved, changed = result["added"], result["moved"], result["status"]
+    with timed("diff.compare", len(old) + len(new)):
+        for skc, (product, status) in new.items():
+            before = old.get(skc)
+            if before is None:
+                added.append((skc, None, product, None, status))
+            elif before[0] != product:
+                moved.append((skc, before[0], product, before[1], status))
+            elif before[1] != status:
+                changed.append((skc, product, product, before[1], status))
+        result["removed"] = [(skc, product, None, status, None)
+                             for skc, (product, status) in old.items() if skc not in new]
+    return result
+
+
+def summary(result):
+    """"新增 3  删除 1  换货号 0  状态变化 12\""""
+    return "  ".join(f"{label} {len(result[kind])}" for kind, label in KIND_LABELS.items())
+
+
+def iter_rows(result):
+    for kind, label in KIND_LABELS.items():
+        for skc, old_product, new_product, old_status, new_status in result[kind]:
+            yield [label, skc, old_product, new_product, old_status, new_status]
+
+
+def write_diff(filename, result, old_name="", new_name=""):
+    """对比结果写成一张表：.csv/.tsv 为平铺文本，其余为 Excel（write_only 流式写出）"""
+    with timed("diff.write", sum(len(rows) for rows in result.values())) as t:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in (".csv", ".tsv", ".txt"):
+            with open(filename, "w", encoding="utf-8-sig", newline="") as f:
+                writer = csv.writer(f, delimiter=skc_core.flat_delimiter(filename))
+                writer.writerow(DIFF_HEADER)
+                writer.writerows(iter_rows(result))
+        else:
+            from openpyxl import Workbook
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("变化")
+            ws.append([f"原: {old_name}", f"新: {new_name}", summary(result)])
+            ws.append(DIFF_HEADER)
+            for row in iter_rows(result):
+                ws.append(row)
+            wb.save(filename)
+        t.bytes = os.path.getsize(filename)
+
+
+def diff_file_name(folder, ext="xlsx"):
+    """项目文件夹中带时间戳的对比结果文件名（不以 skc_ 开头，不算作导出文件）"""
+    return os.path.join(folder, f"diff_{time.strftime('%Y%m%d_%H%M%S')}.{ext}")
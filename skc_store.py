@@ -0,0 +1,343 @@
+import sys, json
+from itertools import chain, repeat
+from collections.abc import Mapping, MutableMapping, ItemsView, ValuesView
+
+# 索引中的值为 (货号编号 << STATUS_BITS) | 状态编码
+STATUS_BITS = 16
+STATUS_MASK = (1 << STATUS_BITS) - 1
+# 一个项目最多的状态种类数（编码放不下时 code() 报错，不会串到货号编号里）
+MAX_STATUSES = STATUS_MASK + 1
+
+
+class _ItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.iter_items()
+
+
+class _ValuesView(ValuesView):
+    def __iter__(self):
+        for _, status in self._mapping.iter_items():
+            yield status
+
+
+class ProductSKCs(MutableMapping):
+    """一个货号下的 SKC：每个状态编码一个 SKC 列表（桶），按编码顺序迭代
+
+    编码顺序就是 status_options 顺序（导入的新状态排在后面），所以货号内始终是按状态整理好的顺序，
+    新增/改状态的 SKC 排在对应状态的末尾。
+    """
+    __slots__ = ("store", "pid", "name", "buckets", "packed")
+
+    def __init__(self, store, pid, name):
+        self.store = store
+        self.pid = pid
+        self.name = name
+        # 状态编码 -> SKC 列表（没有该状态时为 None）
+        self.buckets = []
+        # 状态编码 -> 索引值；同一货号同一状态的 SKC 共用一个 int 对象
+        self.packed = []
+
+    def value(self, code):
+        packed = self.packed
+        while len(packed) <= code:
+            packed.append((self.pid << STATUS_BITS) | len(packed))
+        return packed[code]
+
+    def bucket(self, code):
+        buckets = self.buckets
+        while len(buckets) <= code:
+            buckets.append(None)
+        if buckets[code] is None:
+            buckets[code] = []
+        return buckets[code]
+
+    def __getitem__(self, skc):
+        v = self.store.index.get(skc)
+        if v is None or v >> STATUS_BITS != self.pid:
+            raise KeyError(skc)
+        return self.store.statuses[v & STATUS_MASK]
+
+    def __setitem__(self, skc, status):
+        self.store.put(self.name, skc, status)
+
+    def __delitem__(self, skc):
+        if skc not in self:
+            raise KeyError(skc)
+        self.store.remove(skc)
+
+    def __contains__(self, skc):
+        v = self.store.index.get(skc)
+        return v is not None and v >> STATUS_BITS == self.pid
+
+    def __iter__(self):
+        return chain.from_iterable([b for b in self.buckets if b])
+
+    def __len__(self):
+        return sum(len(b) for b in self.buckets if b)
+
+    def iter_items(self):
+        statuses = self.store.statuses
+        return chain.from_iterable([zip(b, repeat(statuses[code])) for code, b in enumerate(self.buckets) if b])
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+    def status_counts(self):
+        """本货号各状态 SKC 数量（按状态顺序）"""
+        statuses = self.store.statuses
+        return {statuses[code]: len(b) for code, b in enumerate(self.buckets) if b}
+
+    def __repr__(self):
+        return f"ProductSKCs({self.name!r}, {len(self)} SKC)"
+
+
+class SKCIndex(Mapping):
+    """SKC -> 货号 的只读视图（写入请通过 SKCStore）"""
+    __slots__ = ("store",)
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, skc):
+        return self.store.by_pid[self.store.index[skc] >> STATUS_BITS].name
+
+    def get(self, skc, default=None):
+        v = self.store.index.get(skc)
+        return default if v is None else self.store.by_pid[v >> STATUS_BITS].name
+
+    def __contains__(self, skc):
+        return skc in self.store.index
+
+    def __iter__(self):
+        return iter(self.store.index)
+
+    def __len__(self):
+        return len(self.store.index)
+
+
+class SKCStore(MutableMapping):
+    """项目数据 {货号: {SKC: 状态}} 的紧凑存储
+
+    状态存为编码（statuses 表，status_options 在前，导入的新状态追加在后）；
+    index 为 SKC -> (货号编号 << STATUS_BITS) | 状态编码，每个货号按状态分桶保存 SKC 列表。
+    货号/状态字符串 sys.intern，SKC 字符串在索引和各列表间共用同一个对象。
+    一个 SKC 只属于一个货号（与新增/导入时全项目查重一致），重复的以第一次出现为准。
+    30 万 SKC 约占嵌套字典的 60%（约 49 MB → 29 MB）。状态最多 MAX_STATUSES 种。
+    """
+
+    def __init__(self, database=None, statuses=()):
+        self.statuses = [sys.intern(s) for s in statuses]
+        self.codes = {s: i for i, s in enumerate(self.statuses)}
+        self.products = {}
+        self.by_pid = []
+        self.index = {}
+        if database:
+            self.update_from(database)
+
+    # ----- 状态编码 -----
+    def code(self, status):
+        code = self.codes.get(status)
+        if code is None:
+            status = sys.intern(str(status))
+            code = len(self.statuses)
+            if code > STATUS_MASK:
+                raise ValueError(f"状态种类超过上限 {MAX_STATUSES}，无法添加状态 {status[:50]!r}")
+            self.statuses.append(status)
+            self.codes[status] = code
+        return code
+
+    # ----- 货号 -----
+    def add_product(self, name):
+        """确保货号存在，返回它的 ProductSKCs"""
+        prod = self.products.get(name)
+        if prod is None:
+            name = sys.intern(name)
+            prod = ProductSKCs(self, len(self.by_pid), name)
+            self.by_pid.append(prod)
+            self.products[name] = prod
+        return prod
+
+    def __getitem__(self, product):
+        return self.products[product]
+
+    def __setitem__(self, product, skcs):
+        """整体替换一个货号的 SKC"""
+        if product in self.products:
+            self.remove_many(list(self.products[product]))
+        self.add_product(product)
+        for skc, status in skcs.items():
+            self.put(product, skc, status)
+
+    def __delitem__(self, product):
+        prod = self.products.pop(product)
+        for skc in prod:
+            del self.index[skc]
+        self.by_pid[prod.pid] = None
+
+    def __contains__(self, product):
+        return product in self.products
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __repr__(self):
+        return f"SKCStore({len(self.products)} 货号, {len(self.index)} SKC)"
+
+    # ----- SKC -----
+    def skc_index(self):
+        return SKCIndex(self)
+
+    def product_of(self, skc):
+        v = self.index.get(skc)
+        return None if v is None else self.by_pid[v >> STATUS_BITS].name
+
+    def status_of(self, skc):
+        v = self.index.get(skc)
+        return None if v is None else self.statuses[v & STATUS_MASK]
+
+    def add(self, product, skc, status):
+        """SKC 不存在时加到货号中该状态的末尾；返回是否新增"""
+        if skc in self.index:
+            return False
+        prod = self.add_product(product)
+        code = self.code(status)
+        self.index[skc] = prod.value(code)
+        prod.bucket(code).append(skc)
+        return True
+
+    def put(self, product, skc, status):
+        """新增或覆盖；SKC 在其他货号时移到该货号"""
+        v = self.index.get(skc)
+        if v is not None and v >> STATUS_BITS == self.add_product(product).pid:
+            self.set_status(skc, status)
+            return
+        if v is not None:
+            self.remove(skc)
+        self.add(product, skc, status)
+
+    def set_status(self, skc, status):
+        """修改状态（移到新状态的末尾）；返回原状态，SKC 不存在时返回 None"""
+        return self.set_status_many([skc], status)[0]
+
+    def set_status_many(self, skcs, status):
+        """批量修改状态，每个桶只重建一次；返回与输入对应的原状态列表（不存在为 None）"""
+        code = self.code(status)
+        result = []
+        moved = {}
+        for skc in skcs:
+            v = self.index.get(skc)
+            if v is None:
+                result.append(None)
+                continue
+            old = v & STATUS_MASK
+            result.append(self.statuses[old])
+            if old == code:
+                continue
+            prod = self.by_pid[v >> STATUS_BITS]
+            self.index[skc] = prod.value(code)
+            moved.setdefault((prod.pid, old), []).append(skc)
+        for (pid, old), skcs_moved in moved.items():
+            prod = self.by_pid[pid]
+            self._discard(prod.buckets[old], skcs_moved)
+            prod.bucket(code).extend(skcs_moved)
+        return result
+
+    def remove(self, skc):
+        """删除一个 SKC；返回原状态，不存在时返回 None"""
+        return self.remove_many([skc])[0]
+
+    def remove_many(self, skcs):
+        """批量删除，每个桶只重建一次；返回与输入对应的原状态列表（不存在为 None）"""
+        result = []
+        touched = {}
+        for skc in skcs:
+            v = self.index.pop(skc, None)
+            if v is None:
+                result.append(None)
+                continue
+            result.append(self.statuses[v & STATUS_MASK])
+            touched.setdefault((v >> STATUS_BITS, v & STATUS_MASK), []).append(skc)
+        for (pid, code), gone in touched.items():
+            self._discard(self.by_pid[pid].buckets[code], gone)
+        return result
+
+    @staticmethod
+    def _discard(bucket, skcs):
+        if len(skcs) == 1:
+            bucket.remove(skcs[0])
+        else:
+            gone = set(skcs)
+            bucket[:] = [skc for skc in bucket if skc not in gone]
+
+    def update_from(self, database):
+        """从 {货号: {SKC: 状态}} 批量载入（已存在的 SKC 跳过），载入后即按状态整理好"""
+        index, codes = self.index, self.codes
+        for product, skcs in database.items():
+            prod = self.add_product(product)
+            packed, buckets = prod.packed, prod.buckets
+            for skc, status in skcs.items():
+                if skc in index:
+                    continue
+                code = codes.get(status)
+                if code is None:
+                    code = self.code(status)
+                if code < len(packed) and buckets[code] is not None:
+                    index[skc] = packed[code]
+                    buckets[code].append(skc)
+                else:
+                    index[skc] = prod.value(code)
+                    prod.bucket(code).append(skc)
+
+    # ----- 统计/查询 -----
+    def status_counts(self):
+        counts = [0] * len(self.statuses)
+        for prod in self.products.values():
+            for code, b in enumerate(prod.buckets):
+                if b:
+                    counts[code] += len(b)
+        return {s: n for s, n in zip(self.statuses, counts)}
+
+    def skcs_with_status(self, statuses):
+        wanted = [self.codes[s] for s in statuses if s in self.codes]
+        result = set()
+        for prod in self.products.values():
+            buckets = prod.buckets
+            for code in wanted:
+                if code < len(buckets) and buckets[code]:
+                    result.update(buckets[code])
+        return result
+
+    # ----- 复制/转换 -----
+    def copy(self):
+        """快照：索引和各货号的桶各复制一份，状态表复制"""
+        new = SKCStore(statuses=self.statuses)
+        new.index = dict(self.index)
+        new.by_pid = [None] * len(self.by_pid)
+        for name, prod in self.products.items():
+            p = ProductSKCs(new, prod.pid, name)
+            p.buckets = [None if b is None else list(b) for b in prod.buckets]
+            p.packed = list(prod.packed)
+            new.by_pid[prod.pid] = p
+            new.products[name] = p
+        return new
+
+    def to_dict(self):
+        return {p: dict(prod.iter_items()) for p, prod in self.products.items()}
+
+
+def dump_json(f, database, images):
+    """按 json.dump(indent=2) 的格式写出 data.json，逐个货号序列化，不需要先转成一个大 dict"""
+    f.write('{\n  "database": {')
+    first = True
+    for product, skcs in database.items():
+        f.write(("\n" if first else ",\n") + "    " + json.dumps(product, ensure_ascii=False) + ": ")
+        f.write(json.dumps(dict(skcs.items()), ensure_ascii=False, indent=2).replace("\n", "\n    "))
+        first = False
+    f.write("}" if first else "\n  }")
+    f.write(',\n  "images": ' + json.dumps(images, ensure_ascii=False, indent=2).replace("\n", "\n  ") + "\n}")
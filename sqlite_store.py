@@ -0,0 +1,147 @@
+import os, json, sqlite3, threading
+from urllib.parse import quote
+from skc_store import SKCStore, dump_json as write_json
+
+DB_FILE = "data.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    name TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS skcs (
+    skc TEXT PRIMARY KEY,
+    product TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_skcs_status ON skcs(status);
+CREATE INDEX IF NOT EXISTS idx_skcs_product ON skcs(product, pos);
+CREATE TABLE IF NOT EXISTS images (
+    product TEXT PRIMARY KEY,
+    path TEXT NOT NULL
+);
+"""
+
+_connections = {}
+# 连接在 GUI 线程（读取）和后台写盘线程之间共用，同一时刻只允许一个线程使用
+_lock = threading.RLock()
+
+
+def db_path(folder):
+    return os.path.join(folder, DB_FILE)
+
+
+def connect(folder):
+    """每个项目文件夹一个 SQLite 连接，复用（调用方持有 _lock）"""
+    path = os.path.abspath(db_path(folder))
+    conn = _connections.get(path)
+    if conn is None:
+        os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _connections[path] = conn
+    return conn
+
+
+def close(folder):
+    with _lock:
+        conn = _connections.pop(os.path.abspath(db_path(folder)), None)
+        if conn is not None:
+            conn.close()
+
+
+def load(folder, statuses=()):
+    """读取整个项目，返回 (SKCStore, images)，顺序与写入时一致"""
+    database = SKCStore(statuses=statuses)
+    with _lock:
+        conn = connect(folder)
+        for (name,) in conn.execute("SELECT name FROM products ORDER BY pos"):
+            database.add_product(name)
+        for skc, product, status in conn.execute("SELECT skc, product, status FROM skcs ORDER BY pos"):
+            database.add(product, skc, status)
+        images = dict(conn.execute("SELECT product, path FROM images"))
+    return database, images
+
+
+def _bump_version(conn):
+    """写入版本（PRAGMA user_version）加一，随本次事务一起提交；跨项目索引用它判断数据是否变过"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.execute(f"PRAGMA user_version = {(version + 1) % 2 ** 31}")
+
+
+def load_readonly(path):
+    """只读打开一个 data.db（不建表、不迁移、不缓存连接），返回 {货号: {SKC: 状态}}；对比等不应改动数据的场合使用"""
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        database = {name: {} for (name,) in conn.execute("SELECT name FROM products ORDER BY pos")}
+        for skc, product, status in conn.execute("SELECT skc, product, status FROM skcs ORDER BY pos"):
+            database.setdefault(product, {})[skc] = status
+    finally:
+        conn.close()
+    return database
+
+
+def save_all(folder, database, images):
+    """整体重写（新建、导入项目时使用）"""
+    with _lock, connect(folder) as conn:
+        conn.execute("DELETE FROM products")
+        conn.execute("DELETE FROM skcs")
+        conn.execute("DELETE FROM images")
+        conn.executemany("INSERT INTO products(name, pos) VALUES (?, ?)",
+                         ((p, i) for i, p in enumerate(database)))
+        conn.executemany("INSERT OR IGNORE INTO skcs(skc, product, status, pos) VALUES (?, ?, ?, ?)",
+                         ((skc, p, s, i) for i, (p, skc, s) in enumerate(
+                             (p, skc, s) for p, skcs in database.items() for skc, s in skcs.items())))
+        conn.executemany("INSERT INTO images(product, path) VALUES (?, ?)", images.items())
+        _bump_version(conn)
+
+
+def save_changes(folder, rows=(), deleted=(), products=(), images=()):
+    """只写变化的行，一个事务完成
+
+    rows: 新增或修改的 (SKC, 货号, 状态)
+    deleted: 删除的 SKC（先于 rows 执行，删除后又新增的 SKC 会保留）
+    products: 新增的货号
+    images: 图片有变化的 (货号, 路径)，路径为空表示删除
+    """
+    with _lock, connect(folder) as conn:
+        if products:
+            next_pos = conn.execute("SELECT COALESCE(MAX(pos), -1) + 1 FROM products").fetchone()[0]
+            for p in products:
+                cur = conn.execute("INSERT OR IGNORE INTO products(name, pos) VALUES (?, ?)", (p, next_pos))
+                next_pos += cur.rowcount
+        if deleted:
+            conn.executemany("DELETE FROM skcs WHERE skc = ?", ((s,) for s in deleted))
+        if rows:
+            next_pos = conn.execute("SELECT COALESCE(MAX(pos), -1) + 1 FROM skcs").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO skcs(skc, product, status, pos) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(skc) DO UPDATE SET product = excluded.product, status = excluded.status",
+                ((s, p, st, next_pos + i) for i, (s, p, st) in enumerate(rows)))
+        for p, path in images:
+            if path:
+                conn.execute("INSERT OR REPLACE INTO images(product, path) VALUES (?, ?)", (p, path))
+            else:
+                conn.execute("DELETE FROM images WHERE product = ?", (p,))
+        _bump_version(conn)
+
+
+def migrate_json(folder):
+    """一次性迁移：data.db 不存在而 data.json 存在时导入，原 data.json 保留不动"""
+    data_file = os.path.join(folder, "data.json")
+    if os.path.exists(db_path(folder)) or not os.path.exists(data_file):
+        return False
+    with open(data_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    save_all(folder, data.get("database", {}), data.get("images", {}))
+    return True
+
+
+def dump_json(folder, data_file, statuses=()):
+    """导出为 data.json 格式，方便拷贝/导入到其他机器"""
+    database, images = load(folder, statuses)
+    with open(data_file, "w", encoding="utf-8") as f:
+        write_json(f, database, images)
@@ -2,13 +2,20 @@
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QLabel, QComboBox,
-    QTableWidget, QFrame
+    QTableView, QHeaderView, QFrame, QToolButton, QMenu,
+    QCheckBox, QPlainTextEdit, QDialog, QListWidget, QTreeWidget
 )
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QPixmap, QDragEnterEvent, QDropEvent
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import (
+    QPixmap, QImageReader, QDragEnterEvent, QDropEvent, QKeySequence, QShortcut, QFontDatabase
+)
+from skc_core import status_options
+from image_store import IMAGE_EXTENSIONS
 
 
-status_options = ["核价通过", "拉过库存", "已下架", "价格待定", "减少库存为0", "改过体积", "价格错误"]
+export_mode_options = ["修改后延迟导出", "修改后立即导出", "仅手动保存时导出"]
+# 与 skc_core.EXPORT_FORMATS 顺序一致
+export_format_options = ["Excel (xlsx，含图片)", "CSV（货号,SKC,状态）", "TSV（制表符分隔）"]
 
 class ImageDropLabel(QLabel):
     """图片拖拽控件"""
@@ -27,15 +34,261 @@ class ImageDropLabel(QLabel):
         urls = event.mimeData().urls()
         if urls:
             path = urls[0].toLocalFile()
-            if path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                self.setPixmap(QPixmap(path).scaled(150, 150, Qt.KeepAspectRatio))
-                self.image_path = path
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                # 按显示尺寸解码，大图不必整张解出来
+                reader = QImageReader(path)
+                reader.setAutoTransform(True)
+                size = reader.size()
+                if size.isValid():
+                    reader.setScaledSize(size.scaled(150, 150, Qt.KeepAspectRatio))
+                image = reader.read()
+                if not image.isNull():
+                    self.setPixmap(QPixmap.fromImage(image))
+                    self.image_path = path
 
     def clear(self):
         self.setText("拖拽或粘贴图片")
         self.setPixmap(QPixmap())
         self.image_path = None
 
+class SKCTableModel(QAbstractTableModel):
+    """项目数据的表格模型：只保存 SKC 行顺序，货号/状态在绘制可见行时才从项目数据读取"""
+    headers = ["货号", "SKC", "状态"]
+    # 单次删除超过这个数量时直接重置模型
+    RESET_THRESHOLD = 2000
+
+    def __init__(self):
+        super().__init__()
+        self.db = {}
+        self.index_map = {}
+        self.all_rows = []
+        self.rows = self.all_rows
+        self.allowed = None
+        self.row_of = None
+
+    def set_project(self, db, index_map):
+        self.beginResetModel()
+        self.db = {} if db is None else db
+        self.index_map = {} if index_map is None else index_map
+        self.all_rows = [skc for skcs in self.db.values() for skc in skcs]
+        self._apply_filter()
+        self.endResetModel()
+
+    def set_filter(self, allowed):
+        """allowed 为允许显示的 SKC 集合，None 表示显示全部"""
+        self.beginResetModel()
+        self.allowed = allowed
+        self._apply_filter()
+        self.endResetModel()
+
+    def _apply_filter(self):
+        if self.allowed is None:
+            self.rows = self.all_rows
+        else:
+            self.rows = [skc for skc in self.all_rows if skc in self.allowed]
+        self.row_of = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 3
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ToolTipRole and index.column() == 0:
+            # 货号列提示该货号各状态数量
+            product = self.index_map.get(self.rows[index.row()])
+            skcs = self.db.get(product)
+            if skcs is None:
+                return None
+            return "  ".join(f"{s} {n}" for s, n in skcs.status_counts().items())
+        if role != Qt.DisplayRole:
+            return None
+        skc = self.rows[index.row()]
+        col = index.column()
+        if col == 1:
+            return skc
+        product = self.index_map.get(skc)
+        if col == 0:
+            return product
+        return self.db.get(product, {}).get(skc)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return section + 1
+
+    def _row_lookup(self):
+        if self.row_of is None:
+            self.row_of = {skc: r for r, skc in enumerate(self.rows)}
+        return self.row_of
+
+    def _product_starts(self, products):
+        """各货号在全部行中的起始行（调用时这些货号之前的货号行数未变）"""
+        starts = {}
+        start = 0
+        for p, items in self.db.items():
+            if p in products:
+                starts[p] = start
+                if len(starts) == len(products):
+                    break
+            start += len(items)
+        return starts
+
+    def skcs_changed(self, skcs):
+        """状态修改：SKC 移到货号内新状态的位置，只刷新涉及的货号行段（调用前已写入 db）"""
+        products = {self.index_map.get(s) for s in skcs} - {None}
+        if not products:
+            return
+        first = last = None
+        for p, start in self._product_starts(products).items():
+            block = list(self.db[p])
+            self.all_rows[start:start + len(block)] = block
+            first = start if first is None else min(first, start)
+            last = start + len(block) - 1 if last is None else max(last, start + len(block) - 1)
+        if self.allowed is not None:
+            # 筛选状态下只更新全部行，随后由 set_filter 重新筛选
+            return
+        self.row_of = None
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, 2))
+
+    def skcs_added(self, product, skcs):
+        """新增 SKC：按货号内的状态顺序插入（调用前已写入 db）"""
+        if not skcs:
+            return
+        start = self._product_starts({product}).get(product, len(self.all_rows))
+        block = list(self.db.get(product, {}))
+        if self.allowed is not None:
+            self.all_rows[start:start + len(block) - len(skcs)] = block
+            return
+        added = set(skcs)
+        positions = [start + i for i, skc in enumerate(block) if skc in added]
+        # 连续的位置合并成一次插入，按从前到后的顺序插入，位置即最终行号
+        i = 0
+        while i < len(positions):
+            j = i
+            while j + 1 < len(positions) and positions[j + 1] == positions[j] + 1:
+                j += 1
+            first, last = positions[i], positions[j]
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.rows[first:first] = block[first - start:last - start + 1]
+            self.endInsertRows()
+            i = j + 1
+        self.row_of = None
+
+    def skcs_removed(self, skcs):
+        """删除 SKC：按连续区间移除行（调用后 db 中已删除）"""
+        if self.allowed is not None:
+            removed = set(skcs)
+            self.all_rows = [skc for skc in self.all_rows if skc not in removed]
+            return
+        if len(skcs) > self.RESET_THRESHOLD:
+            self.set_project(self.db, self.index_map)
+            return
+        row_of = self._row_lookup()
+        rows = sorted((row_of[s] for s in skcs if s in row_of), reverse=True)
+        i = 0
+        while i < len(rows):
+            last = first = rows[i]
+            while i + 1 < len(rows) and rows[i + 1] == first - 1:
+                i += 1
+                first = rows[i]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            self.endRemoveRows()
+            i += 1
+        self.row_of = None
+
+
+class SKCLookupDialog(QDialog):
+    """跨项目查找 SKC：粘贴 SKC 列表，列出所在项目/货号/状态"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("跨项目查找 SKC")
+        self.resize(640, 520)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("SKC（空格/换行分隔，可直接粘贴）:"))
+        self.input = QPlainTextEdit()
+        layout.addWidget(self.input, 1)
+        btn_h = QHBoxLayout()
+        self.btn_find = QPushButton("查找")
+        self.btn_copy = QPushButton("复制结果")
+        btn_h.addWidget(self.btn_find)
+        btn_h.addWidget(self.btn_copy)
+        btn_h.addStretch()
+        layout.addLayout(btn_h)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.result = QPlainTextEdit()
+        self.result.setReadOnly(True)
+        self.result.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.result, 2)
+
+
+class ChangeHistoryDialog(QDialog):
+    """修改记录：列出最近的修改，恢复到任一步之后的状态（已撤销的修改显示在最后，可以重做）"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("修改记录")
+        self.resize(560, 480)
+        layout = QVBoxLayout(self)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.list = QListWidget()
+        layout.addWidget(self.list, 1)
+        btn_h = QHBoxLayout()
+        self.btn_restore = QPushButton("恢复到选中的这一步之后")
+        btn_h.addWidget(self.btn_restore)
+        btn_h.addStretch()
+        layout.addLayout(btn_h)
+
+
+class BatchEditDialog(QDialog):
+    """批量修改/删除：粘贴或读取文件中的 SKC [状态] 行，预览后一次应用"""
+    modes = ["修改状态", "删除"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("批量修改 / 删除 SKC")
+        self.resize(720, 640)
+        layout = QVBoxLayout(self)
+        option_h = QHBoxLayout()
+        option_h.addWidget(QLabel("操作:"))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(self.modes)
+        option_h.addWidget(self.mode_combo)
+        option_h.addWidget(QLabel("没写状态的行改为:"))
+        self.status_combo = QComboBox()
+        self.status_combo.addItems(status_options)
+        option_h.addWidget(self.status_combo)
+        option_h.addStretch()
+        layout.addLayout(option_h)
+        self.input = QPlainTextEdit()
+        self.input.setPlaceholderText("每行一个或多个 SKC，行末可跟状态（空格、制表符或逗号分隔），例如：\n"
+                                      "SKC001 已下架\nSKC002\t核价通过\nSKC003 SKC004")
+        layout.addWidget(self.input, 1)
+        btn_h = QHBoxLayout()
+        self.btn_file = QPushButton("从文件读取...")
+        self.btn_preview = QPushButton("预览")
+        self.btn_apply = QPushButton("应用")
+        self.btn_apply.setEnabled(False)
+        for btn in [self.btn_file, self.btn_preview]:
+            btn_h.addWidget(btn)
+        btn_h.addStretch()
+        btn_h.addWidget(self.btn_apply)
+        layout.addLayout(btn_h)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.preview = QTreeWidget()
+        self.preview.setHeaderLabels(["SKC", "货号", "原状态", "新状态"])
+        layout.addWidget(self.preview, 2)
+
+
 class SKCUI(QWidget):
     """界面布局，UI独立于逻辑"""
     def __init__(self):
@@ -83,9 +336,21 @@ class SKCUI(QWidget):
         self.btn_add = QPushButton("添加SKC")
         self.btn_batch_modify = QPushButton("批量修改 SKC")
         self.btn_batch_delete = QPushButton("批量删除 SKC")
-        self.btn_auto_sort = QPushButton("自动整理/手动保存")
-        for btn in [self.btn_add, self.btn_batch_modify, self.btn_batch_delete, self.btn_auto_sort]:
+        self.btn_export_now = QPushButton("立即导出")
+        for btn in [self.btn_add, self.btn_batch_modify, self.btn_batch_delete, self.btn_export_now]:
             left_col.addWidget(btn)
+        history_h = QHBoxLayout()
+        self.btn_undo = QPushButton("撤销")
+        self.btn_redo = QPushButton("重做")
+        self.btn_history = QPushButton("修改记录")
+        for btn in [self.btn_undo, self.btn_redo, self.btn_history]:
+            history_h.addWidget(btn)
+        left_col.addLayout(history_h)
+        self.cross_project_check = QCheckBox("添加时检查其他项目中的重复 SKC")
+        self.cross_project_check.setChecked(True)
+        left_col.addWidget(self.cross_project_check)
+        self.btn_lookup = QPushButton("跨项目查找 SKC")
+        left_col.addWidget(self.btn_lookup)
 
         # 图片拖拽区
         left_col.addWidget(QLabel("选择货号添加图片:"))
@@ -98,15 +363,84 @@ class SKCUI(QWidget):
         left_col.addWidget(self.btn_add_image)
 
         # Excel 导入/打开
-        self.btn_import_excel = QPushButton("导入 Excel 数据")
+        self.btn_import_excel = QPushButton("导入 Excel/CSV 数据")
+        self.btn_import_folder = QPushButton("导入文件夹")
         self.btn_open_latest = QPushButton("打开 Excel")
-        for btn in [self.btn_import_excel, self.btn_open_latest]:
+        self.btn_export_all = QPushButton("导出全部项目 Excel")
+        self.btn_diff = QPushButton("对比变化")
+        for btn in [self.btn_import_excel, self.btn_import_folder, self.btn_open_latest, self.btn_export_all,
+                    self.btn_diff]:
             left_col.addWidget(btn)
+        left_col.addWidget(QLabel("Excel 导出方式:"))
+        self.export_mode_combo = QComboBox()
+        self.export_mode_combo.addItems(export_mode_options)
+        left_col.addWidget(self.export_mode_combo)
+        left_col.addWidget(QLabel("导出格式:"))
+        self.export_format_combo = QComboBox()
+        self.export_format_combo.addItems(export_format_options)
+        left_col.addWidget(self.export_format_combo)
 
         left_col.addStretch()
 
-        # 数据表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["货号", "SKC", "状态"])
-        main_layout.addWidget(self.table, 1)
+        right_col = QVBoxLayout()
+        main_layout.addLayout(right_col, 1)
+
+        # 筛选栏
+        filter_h = QHBoxLayout()
+        self.filter_skc = QLineEdit()
+        self.filter_skc.setPlaceholderText("SKC 前缀")
+        self.filter_product = QLineEdit()
+        self.filter_product.setPlaceholderText("货号包含")
+        self.btn_filter_status = QToolButton()
+        self.btn_filter_status.setText("状态筛选")
+        self.btn_filter_status.setPopupMode(QToolButton.InstantPopup)
+        status_menu = QMenu(self.btn_filter_status)
+        self.status_filter_actions = []
+        for s in status_options:
+            action = status_menu.addAction(s)
+            action.setCheckable(True)
+            self.status_filter_actions.append(action)
+        self.btn_filter_status.setMenu(status_menu)
+        self.btn_clear_filter = QPushButton("清除筛选")
+        for w in [self.filter_skc, self.filter_product, self.btn_filter_status, self.btn_clear_filter]:
+            filter_h.addWidget(w)
+        right_col.addLayout(filter_h)
+
+        # 数据表格（模型/视图，只绘制可见行）
+        self.table_model = SKCTableModel()
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(24)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        right_col.addWidget(self.table, 1)
+        self.status_count_label = QLabel()
+        right_col.addWidget(self.status_count_label)
+
+        # 性能统计面板（默认隐藏，Ctrl+Shift+P 显示/隐藏）
+        self.perf_panel = QFrame()
+        self.perf_panel.setFrameShape(QFrame.StyledPanel)
+        perf_v = QVBoxLayout(self.perf_panel)
+        perf_h = QHBoxLayout()
+        self.perf_enabled = QCheckBox("开启计时")
+        self.btn_perf_clear = QPushButton("清空")
+        self.btn_perf_log = QPushButton("写入日志文件...")
+        perf_h.addWidget(self.perf_enabled)
+        perf_h.addStretch()
+        for btn in [self.btn_perf_clear, self.btn_perf_log]:
+            perf_h.addWidget(btn)
+        perf_v.addLayout(perf_h)
+        self.perf_text = QPlainTextEdit()
+        self.perf_text.setReadOnly(True)
+        self.perf_text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.perf_text.setFixedHeight(180)
+        perf_v.addWidget(self.perf_text)
+        self.perf_panel.hide()
+        right_col.addWidget(self.perf_panel)
+        self.perf_shortcut = QShortcut(QKeySequence("Ctrl+Shift+P"), self)
+        # 输入框有焦点时 Ctrl+Z 仍是撤销输入的文字
+        self.undo_shortcut = QShortcut(QKeySequence.Undo, self)
+        self.redo_shortcut = QShortcut(QKeySequence.Redo, self)
+
+    def selected_statuses(self):
+        return [a.text() for a in self.status_filter_actions if a.isChecked()]